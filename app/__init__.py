@@ -0,0 +1,3 @@
+import time
+
+BOOTED_AT = time.perf_counter()
@@ -0,0 +1,61 @@
+import logging
+import os
+from typing import Any, Dict
+
+import uvicorn
+
+from app.config import settings
+from app.db.utils import calibrate, hasher
+
+logger = logging.getLogger(name=__name__)
+
+
+def worker_count() -> int:
+    if settings.user_backend == "memory":
+        return 1
+    return max(1, min(settings.server_workers or os.cpu_count() or 1, settings.db_conn_budget))
+
+
+def worker_settings(workers: int) -> Dict[str, Any]:
+    pool_size = max(1, min(settings.db_pool_max_size, settings.db_conn_budget // workers))
+    overrides: Dict[str, Any] = {
+        "db_pool_max_size": pool_size,
+        "db_pool_min_size": min(settings.db_pool_min_size, pool_size),
+        "hash_workers": settings.hash_workers or max(1, (os.cpu_count() or 1) // workers),
+    }
+    if settings.hash_calibrate and not settings.hash_rounds:
+        overrides["hash_rounds"] = calibrate(settings.hash_budget_ms)
+    return overrides
+
+
+def apply(overrides: Dict[str, Any]) -> None:
+    for name, value in overrides.items():
+        os.environ[name.upper()] = str(value)
+        setattr(settings, name, value)
+    hasher.rounds, hasher.workers = settings.hash_rounds, settings.hash_workers
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    workers = worker_count()
+    apply(worker_settings(workers))
+    logger.info(
+        "Starting %d worker(s) with up to %d connections per database pool and %s bcrypt rounds",
+        workers, settings.db_pool_max_size, settings.hash_rounds or "default",
+    )
+    uvicorn.run(
+        "app.main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keep_alive,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.server_proxy_ips,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+from app.config import settings
+from app.db.utils import calibrate, hash_seconds, pass_manager
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Pick the bcrypt cost that fits a per-hash latency budget on this machine."
+    )
+    parser.add_argument("--budget-ms", type=float, default=settings.hash_budget_ms)
+    args = parser.parse_args(argv)
+
+    rounds = calibrate(args.budget_ms)
+    report = {
+        "budget_ms": args.budget_ms,
+        "rounds": rounds,
+        "hash_ms": round(hash_seconds(rounds, samples=1) * 1000, 1),
+        "configured_rounds": settings.hash_rounds,
+        "passlib_default_rounds": pass_manager.handler("bcrypt").default_rounds,
+        "env": f"HASH_ROUNDS={rounds}",
+    }
+    sys.stdout.write(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
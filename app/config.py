@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseSettings
 from sqlalchemy.engine.url import URL
@@ -14,6 +14,66 @@ class Settings(BaseSettings):
     postgres_host     : str
     postgres_port     : str
     postgres_database : str
+    postgres_replicas : List[str] = []
+    
+    db_pool_min_size        : int = 2
+    db_pool_max_size        : int = 10
+    db_statement_timeout_ms : int = 30_000
+    db_conn_max_queries     : int = 50_000
+    db_conn_idle_lifetime   : float = 300.0
+    read_your_writes_secs   : float = 5.0
+    db_conn_budget          : int = 90
+    
+    user_backend      : Literal["postgres", "memory"] = "postgres"
+    
+    hash_pool_kind    : Literal["process", "thread"] = "process"
+    hash_workers      : Optional[int] = None
+    hash_queue_size   : int = 64
+    hash_rounds       : Optional[int] = None
+    hash_calibrate    : bool = False
+    hash_budget_ms    : float = 250.0
+    
+    principal_cache_size : int = 10_000
+    principal_cache_ttl  : float = 60.0
+    
+    user_loader           : bool = False
+    user_loader_window_ms : float = 2.0
+    user_loader_max_batch : int = 100
+    
+    stateless_auth           : bool = False
+    stateless_token_exp_mins : int = 5
+    
+    token_cache_size   : int = 10_000
+    token_negative_ttl : float = 5.0
+    
+    login_ip_burst      : int = 30
+    login_ip_per_min    : float = 30.0
+    login_user_burst    : int = 10
+    login_user_per_min  : float = 5.0
+    login_throttle_keys : int = 100_000
+    
+    bulk_max_size     : int = 10_000
+    bulk_batch_size   : int = 500
+    batch_max_size    : int = 500
+    
+    upload_dir              : str = "uploads"
+    upload_chunk_size       : int = 1024 * 1024
+    upload_max_file_size    : int = 100 * 1024 * 1024
+    upload_max_request_size : int = 512 * 1024 * 1024
+    
+    warm_up : bool = True
+    
+    log_config       : str = "log.ini"
+    log_json         : bool = False
+    log_queue_size   : int = 10_000
+    log_sample_every : Dict[int, int] = {401: 100, 403: 100, 404: 10, 429: 100}
+    
+    server_host       : str = "0.0.0.0"
+    server_port       : int = 80
+    server_workers    : Optional[int] = None
+    server_keep_alive : int = 5
+    server_backlog    : int = 2048
+    server_proxy_ips  : str = "127.0.0.1"
     
     class Config:
         env_file = '.env'
@@ -21,12 +81,13 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-def get_conn_url(sync: bool = False) -> URL:
+def get_conn_url(sync: bool = False, replica: str = "") -> URL:
+    host, _, port = replica.partition(":")
     return URL.create(  # type: ignore
     drivername=f"postgresql+{'psycopg2' if sync else 'asyncpg'}",
     username=settings.postgres_user,
     password=settings.postgres_password,
-    host=settings.postgres_host,
-    port=settings.postgres_port,
+    host=host or settings.postgres_host,
+    port=port or settings.postgres_port,
     database=settings.postgres_database
 )
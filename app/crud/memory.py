@@ -0,0 +1,139 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from itertools import islice
+from typing import AsyncGenerator, Dict, List, Optional, Sequence, Set, Tuple
+
+from pydantic import UUID4
+
+from app.crud.repository import NO_LIMIT, Conflict, PageKey, Period, Row, Stale, UserFilter, UserRepository, UserRow
+
+HIDDEN_COLUMNS = ("password",)
+
+
+def aware(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def within(dt: datetime, period: Period) -> bool:
+    since, until = period
+    return (not since or dt >= aware(since)) and (not until or dt < aware(until))
+
+
+def matches(row: Row, where: UserFilter) -> bool:
+    username, email = row["username"].lower(), row["email"].lower()
+    return (
+        (where.username_prefix is None or username.startswith(where.username_prefix.lower()))
+        and (where.username_contains is None or where.username_contains.lower() in username)
+        and (where.email_prefix is None or email.startswith(where.email_prefix.lower()))
+        and (where.email_contains is None or where.email_contains.lower() in email)
+        and (where.active is None or row["active"] == where.active)
+        and (where.admin is None or row["admin"] == where.admin)
+        and within(row["created_at"], (where.created_since, where.created_until))
+        and within(row["updated_at"], (where.updated_since, where.updated_until))
+    )
+
+
+class MemoryUserRepository(UserRepository):
+    
+    def __init__(self) -> None:
+        self._by_id:       Dict[UUID4, Row] = {}
+        self._by_username: Dict[str, UUID4] = {}
+        self._by_email:    Dict[str, UUID4] = {}
+        self._order:       List[Tuple[datetime, UUID4]] = []
+
+    async def insert(self, row: UserRow) -> None:
+        self._check_unique(row)
+        self._add(row)
+
+    async def insert_many(self, rows: Sequence[UserRow]) -> Set[UUID4]:
+        created = set()
+        for row in rows:
+            try:
+                self._check_unique(row)
+            except Conflict:
+                continue
+            self._add(row)
+            created.add(row["id"])
+        return created
+
+    async def get(self, _id: UUID4, fresh: bool = False) -> Optional[Row]:
+        found = self._by_id.get(_id)
+        return Row(found) if found else None
+
+    async def get_batch(self, ids: Sequence[UUID4], fresh: bool = False) -> List[Row]:
+        return [Row(self._by_id[_id]) for _id in ids if _id in self._by_id]
+
+    async def get_by_username(self, username: str) -> Optional[Row]:
+        _id = self._by_username.get(username.lower())
+        return await self.get(_id) if _id else None
+
+    async def get_many(
+        self,
+        limit: int,
+        page_key: Optional[PageKey] = None,
+        skip: int = 0,
+        fresh: bool = False,
+        where: Optional[UserFilter] = None,
+    ) -> List[Row]:
+        start = bisect_left(self._order, (aware(page_key[0]), page_key[1])) if page_key else 0
+        if page_key and start < len(self._order) and self._order[start] == (aware(page_key[0]), page_key[1]):
+            start += 1
+        if not where:
+            keys = self._order[start + skip:start + skip + limit]
+            return [Row(self._by_id[_id]) for _, _id in keys]
+        
+        found = (self._by_id[_id] for _, _id in self._order[start:] if matches(self._by_id[_id], where))
+        return [Row(r) for r in islice(found, skip, skip + limit)]
+
+    async def iterate(self, created: Period = NO_LIMIT, updated: Period = NO_LIMIT) -> AsyncGenerator[Row, None]:
+        for _, _id in list(self._order):
+            found = self._by_id.get(_id)
+            if found and within(found["created_at"], created) and within(found["updated_at"], updated):
+                yield Row((k, v) for k, v in found.items() if k not in HIDDEN_COLUMNS)
+
+    async def update(self, _id: UUID4, vals: UserRow, updated_at: Optional[datetime] = None) -> Optional[Row]:
+        found = self._by_id.get(_id)
+        if not found:
+            return None
+        if updated_at and found["updated_at"] != aware(updated_at):
+            raise Stale()
+        self._check_unique(vals, _id)
+        
+        if "username" in vals:
+            del self._by_username[found["username"].lower()]
+            self._by_username[vals["username"].lower()] = _id
+        if "email" in vals:
+            del self._by_email[found["email"].lower()]
+            self._by_email[vals["email"].lower()] = _id
+        found.update(vals, **{k: aware(v) for k, v in vals.items() if isinstance(v, datetime)})
+        return Row(found)
+
+    async def delete(self, _id: UUID4) -> Optional[bool]:
+        found = self._by_id.pop(_id, None)
+        if not found:
+            return None
+        del self._by_username[found["username"].lower()]
+        del self._by_email[found["email"].lower()]
+        del self._order[bisect_left(self._order, (found["created_at"], _id))]
+        return True
+
+    async def purge(self) -> None:
+        self._by_id.clear()
+        self._by_username.clear()
+        self._by_email.clear()
+        self._order.clear()
+
+    def _check_unique(self, row: UserRow, _id: Optional[UUID4] = None) -> None:
+        if row.get("id") in self._by_id:
+            raise Conflict()
+        for col, index in (("username", self._by_username), ("email", self._by_email)):
+            owner = index.get(row[col].lower()) if col in row else None
+            if owner is not None and owner != _id:
+                raise Conflict()
+
+    def _add(self, row: UserRow) -> None:
+        stored = Row(row, created_at=aware(row["created_at"]), updated_at=aware(row["updated_at"]))
+        self._by_id[stored["id"]] = stored
+        self._by_username[stored["username"].lower()] = stored["id"]
+        self._by_email[stored["email"].lower()] = stored["id"]
+        insort(self._order, (stored["created_at"], stored["id"]))
@@ -0,0 +1,224 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+from asyncpg import Connection, UniqueViolationError
+from pydantic import UUID4
+from sqlalchemy import Column, any_, bindparam, func, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.sql import ColumnElement, Select
+
+from app.config import settings
+from app.crud.repository import NO_LIMIT, Conflict, PageKey, Period, Row, Stale, UserFilter, UserRepository, UserRow
+from app.db import session
+from app.db.session import acquire, pools, raw_pool, reader
+from app.db.statements import Statement
+from app.models.users import users
+
+PUBLIC_COLUMNS = [c for c in users.c if c.name != "password"]
+
+by_id   = users.c.id == bindparam("_id")
+ordered = users.select().order_by(users.c.created_at, users.c.id).limit(bindparam("limit")).offset(bindparam("skip", 0))
+after   = tuple_(users.c.created_at, users.c.id) > tuple_(
+    bindparam("after_created_at", type_=users.c.created_at.type), bindparam("after_id", type_=users.c.id.type)
+)
+
+INSERT      = Statement(users.insert())
+GET         = Statement(users.select().where(by_id))
+GET_BATCH   = Statement(users.select().where(users.c.id == any_(bindparam("ids", type_=ARRAY(users.c.id.type)))))
+GET_BY_NAME = Statement(users.select().where(func.lower(users.c.username) == func.lower(bindparam("username"))))
+PAGE_FIRST  = Statement(ordered)
+PAGE_AFTER  = Statement(ordered.where(after))
+DELETE      = Statement(users.delete().where(by_id).returning(True))
+PURGE       = Statement(users.delete())
+
+LIKE_PATTERNS = {
+    "username_contains": (users.c.username, "%{}%"),
+    "email_contains":    (users.c.email, "%{}%"),
+}
+PREFIXES = ("username_prefix", "email_prefix")
+RANGES = {
+    "username_prefix":     func.lower(users.c.username).op("~>=~", is_comparison=True)(bindparam("username_prefix")),
+    "username_prefix_end": func.lower(users.c.username).op("~<~", is_comparison=True)(bindparam("username_prefix_end")),
+    "email_prefix":        func.lower(users.c.email).op("~>=~", is_comparison=True)(bindparam("email_prefix")),
+    "email_prefix_end":    func.lower(users.c.email).op("~<~", is_comparison=True)(bindparam("email_prefix_end")),
+    "created_since": users.c.created_at >= bindparam("created_since", type_=users.c.created_at.type),
+    "created_until": users.c.created_at < bindparam("created_until", type_=users.c.created_at.type),
+    "updated_since": users.c.updated_at >= bindparam("updated_since", type_=users.c.updated_at.type),
+    "updated_until": users.c.updated_at < bindparam("updated_until", type_=users.c.updated_at.type),
+}
+FilterShape = Tuple[bool, Tuple[str, ...], Optional[bool], Optional[bool]]
+
+NIL_ID        = UUID(int=0)
+WARM_UP_READS = (
+    (GET, {"_id": NIL_ID}),
+    (GET_BATCH, {"ids": []}),
+    (GET_BY_NAME, {"username": ""}),
+    (PAGE_FIRST, {"limit": 0}),
+    (PAGE_AFTER, {"limit": 0, "after_created_at": datetime.fromtimestamp(0, timezone.utc), "after_id": NIL_ID}),
+)
+WARM_UP_WRITES = (INSERT, DELETE)
+
+
+def in_range(q: Select, col: Column, period: Period) -> Select:
+    since, until = period
+    if since:
+        q = q.where(col >= since)
+    if until:
+        q = q.where(col < until)
+    return q
+
+
+def escape_like(value: str) -> str:
+    return value.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return None
+    nxt = ord(stem[-1]) + 1
+    return stem[:-1] + chr(0xE000 if 0xD800 <= nxt < 0xE000 else nxt)
+
+
+def flag(col: Column, value: Optional[bool]) -> Optional[ColumnElement]:
+    if value is None:
+        return None
+    return col if value else ~col
+
+
+class PostgresUserRepository(UserRepository):
+
+    def __init__(self) -> None:
+        self._updates: Dict[Tuple[Tuple[str, ...], bool], Statement] = {}
+        self._filters: Dict[FilterShape, Statement] = {}
+
+    async def connect(self) -> None:
+        await session.connect()
+
+    async def disconnect(self) -> None:
+        await session.disconnect()
+
+    async def warm_up(self) -> None:
+        for name in pools:
+            pool = raw_pool(name)
+            if pool is None:
+                continue
+            conns = [await pool.acquire() for _ in range(pool.get_min_size())]
+            try:
+                await asyncio.gather(*(self._warm_up(conn) for conn in conns))
+            finally:
+                for conn in conns:
+                    await pool.release(conn)
+
+    async def insert(self, row: UserRow) -> None:
+        try:
+            await INSERT.execute(**row)
+        except UniqueViolationError as e:
+            raise Conflict() from e
+
+    async def insert_many(self, rows: Sequence[UserRow]) -> Set[UUID4]:
+        created = set()
+        async with acquire() as conn:
+            for i in range(0, len(rows), settings.bulk_batch_size):
+                q = insert(users).values(rows[i:i + settings.bulk_batch_size]).on_conflict_do_nothing()
+                stmt = Statement(q.returning(users.c.id))
+                created.update(r["id"] for r in await conn.fetch(stmt.sql, *stmt.args({})))
+        return created
+
+    async def get(self, _id: UUID4, fresh: bool = False) -> Optional[Row]:
+        return await GET.fetch_one(reader(fresh), _id=_id)
+
+    async def get_batch(self, ids: Sequence[UUID4], fresh: bool = False) -> List[Row]:
+        return await GET_BATCH.fetch_all(reader(fresh), ids=list(ids))
+
+    async def get_by_username(self, username: str) -> Optional[Row]:
+        return await GET_BY_NAME.fetch_one(username=username)
+
+    async def get_many(
+        self,
+        limit: int,
+        page_key: Optional[PageKey] = None,
+        skip: int = 0,
+        fresh: bool = False,
+        where: Optional[UserFilter] = None,
+    ) -> List[Row]:
+        using = reader(fresh)
+        if where:
+            stmt, params = self.filtered(where, page_key)
+            return await stmt.fetch_all(using, limit=limit, skip=skip, **params)
+        if page_key:
+            created_at, _id = page_key
+            return await PAGE_AFTER.fetch_all(using, limit=limit, skip=skip, after_created_at=created_at, after_id=_id)
+        return await PAGE_FIRST.fetch_all(using, limit=limit, skip=skip)
+
+    def iterate(self, created: Period = NO_LIMIT, updated: Period = NO_LIMIT) -> AsyncGenerator[Row, None]:
+        q = select(PUBLIC_COLUMNS).order_by(users.c.created_at, users.c.id)
+        q = in_range(q, users.c.created_at, created)
+        q = in_range(q, users.c.updated_at, updated)
+        return Statement(q).iterate(reader())
+
+    async def update(self, _id: UUID4, vals: UserRow, updated_at: Optional[datetime] = None) -> Optional[Row]:
+        stmt = self._update_stmt(tuple(sorted(vals)), conditional=bool(updated_at))
+        try:
+            updated = await stmt.fetch_one(_id=_id, if_updated_at=updated_at, **vals)
+        except UniqueViolationError as e:
+            raise Conflict() from e
+        if not updated and updated_at and await GET.fetch_one(_id=_id):
+            raise Stale()
+        return updated
+
+    async def delete(self, _id: UUID4) -> Optional[bool]:
+        return await DELETE.execute(_id=_id)
+
+    async def purge(self) -> None:
+        await PURGE.execute()
+
+    async def _warm_up(self, conn: Connection) -> None:
+        for stmt, params in WARM_UP_READS:
+            await conn.fetch(stmt.sql, *stmt.args(params))
+        for stmt in WARM_UP_WRITES:
+            await conn.prepare(stmt.sql)
+
+    def filtered(self, where: UserFilter, page_key: Optional[PageKey] = None) -> Tuple[Statement, Dict[str, Any]]:
+        params: Dict[str, Any] = {k: v for k, v in where.items().items() if k not in ("active", "admin")}
+        for name, (_, pattern) in LIKE_PATTERNS.items():
+            if name in params:
+                params[name] = pattern.format(escape_like(params[name]))
+        for name in PREFIXES:
+            if name in params:
+                params[name] = params[name].lower()
+                end = prefix_end(params[name])
+                if end:
+                    params[f"{name}_end"] = end
+        if page_key:
+            params.update(after_created_at=page_key[0], after_id=page_key[1])
+        return self._filter_stmt((bool(page_key), tuple(sorted(params)), where.active, where.admin)), params
+
+    def _filter_stmt(self, shape: FilterShape) -> Statement:
+        stmt = self._filters.get(shape)
+        if not stmt:
+            paged, names, active, admin = shape
+            q = ordered.where(after) if paged else ordered
+            for name in names:
+                if name in LIKE_PATTERNS:
+                    col, _ = LIKE_PATTERNS[name]
+                    q = q.where(func.lower(col).like(bindparam(name)))
+                elif name in RANGES:
+                    q = q.where(RANGES[name])
+            for cond in (flag(users.c.active, active), flag(users.c.admin, admin)):
+                if cond is not None:
+                    q = q.where(cond)
+            stmt = self._filters[shape] = Statement(q)
+        return stmt
+
+    def _update_stmt(self, cols: Tuple[str, ...], conditional: bool = False) -> Statement:
+        stmt = self._updates.get((cols, conditional))
+        if not stmt:
+            q = users.update().where(by_id).values({c: bindparam(c) for c in cols}).returning(*users.c)
+            if conditional:
+                q = q.where(users.c.updated_at == bindparam("if_updated_at", type_=users.c.updated_at.type))
+            stmt = self._updates[(cols, conditional)] = Statement(q)
+        return stmt
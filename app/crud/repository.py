@@ -0,0 +1,114 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from pydantic import UUID4
+
+PageKey  = Tuple[datetime, UUID4]
+Period   = Tuple[Optional[datetime], Optional[datetime]]
+UserRow  = Dict[str, Any]
+NO_LIMIT = (None, None)
+
+
+class Conflict(Exception):
+    pass
+
+
+class Stale(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class UserFilter:
+    username_prefix:   Optional[str] = None
+    username_contains: Optional[str] = None
+    email_prefix:      Optional[str] = None
+    email_contains:    Optional[str] = None
+    active:            Optional[bool] = None
+    admin:             Optional[bool] = None
+    created_since:     Optional[datetime] = None
+    created_until:     Optional[datetime] = None
+    updated_since:     Optional[datetime] = None
+    updated_until:     Optional[datetime] = None
+
+    def items(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if getattr(self, f.name) is not None}
+
+    def __bool__(self) -> bool:
+        return bool(self.items())
+
+
+class Row(dict):
+    
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError as e:
+            raise AttributeError(name) from e
+
+    @property
+    def _mapping(self) -> Mapping[str, Any]:
+        return self
+
+
+class UserRepository(ABC):
+    
+    async def connect(self) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def warm_up(self) -> None:
+        """Runs each query shape once on every pooled connection, so first requests skip the setup."""
+
+    @abstractmethod
+    async def insert(self, row: UserRow) -> None:
+        """Raises `Conflict` if the username or email is taken."""
+
+    @abstractmethod
+    async def insert_many(self, rows: Sequence[UserRow]) -> Set[UUID4]:
+        """Skips conflicting rows and returns the ids actually inserted."""
+
+    @abstractmethod
+    async def get(self, _id: UUID4, fresh: bool = False) -> Optional[Row]:
+        """`fresh` asks for a read that sees this process's latest writes."""
+
+    @abstractmethod
+    async def get_batch(self, ids: Sequence[UUID4], fresh: bool = False) -> List[Row]:
+        """Returns the users found among `ids`, in no particular order."""
+
+    @abstractmethod
+    async def get_by_username(self, username: str) -> Optional[Row]:
+        ...
+
+    @abstractmethod
+    async def get_many(
+        self,
+        limit: int,
+        page_key: Optional[PageKey] = None,
+        skip: int = 0,
+        fresh: bool = False,
+        where: Optional[UserFilter] = None,
+    ) -> List[Row]:
+        """Pages through users matching `where`, ordered by (created_at, id). Text filters ignore case."""
+
+    @abstractmethod
+    def iterate(self, created: Period = NO_LIMIT, updated: Period = NO_LIMIT) -> AsyncGenerator[Row, None]:
+        """Streams users without their password hashes, ordered by (created_at, id)."""
+
+    @abstractmethod
+    async def update(
+        self, _id: UUID4, vals: UserRow, updated_at: Optional[datetime] = None
+    ) -> Optional[Row]:
+        """Returns the updated row, or None if there is no such user. Raises `Conflict` if the new username or email
+        is taken and `Stale` if `updated_at` is given and the stored row has moved on."""
+
+    @abstractmethod
+    async def delete(self, _id: UUID4) -> Optional[bool]:
+        ...
+
+    @abstractmethod
+    async def purge(self) -> None:
+        ...
@@ -1,86 +1,288 @@
+import asyncio
 from collections.abc import Sequence
 from datetime import datetime
-from typing import Dict, Optional, Union
+from typing import AsyncGenerator, Dict, List, Optional, Set, Union
 from uuid import uuid4
 
-from asyncpg import UniqueViolationError
-from databases.backends.postgres import Record
 from pydantic import UUID4
 
-from app.db.session import db
-from app.db.utils import pass_manager
-from app.models.users import users
+from app.cache import TTLCache
+from app.config import settings
+from app.crud.repository import Conflict, PageKey, Row, Stale, UserFilter, UserRepository
+from app.db.utils import hasher
+from app.identity import identities, pinned
+from app.metrics import Counter, Histogram
+from app.revocation import RevocationFilter
 from app.schemas.users import UserInfoUpd, UsrIn
 
 UserAutoAssigned = Dict[str, Union[UUID4, datetime]]
 UserAllAttrs     = Dict[str, Union[UUID4, datetime, str, bool]]
 
+PUBLIC_FIELDS = ("id", "created_at", "updated_at", "username", "email", "active", "admin")
+
+principals: TTLCache[Row] = TTLCache(settings.principal_cache_size, settings.principal_cache_ttl)
+revoked = RevocationFilter(retention=settings.stateless_token_exp_mins * 60)
+
+recent_writes: TTLCache[bool] = TTLCache(settings.principal_cache_size, settings.read_your_writes_secs)
+
+DB_LATENCY    = Histogram("db_query_seconds", "Time spent in UserCRUD repository calls.", ("op",))
+LOADER_BATCH  = Histogram(
+    "user_loader_batch_size", "Distinct ids per coalesced user lookup.", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+PRINCIPAL_HIT = Counter(
+    "principal_cache_requests_total", "Principal cache lookups by result.", ("result",), 
+    fn=lambda: [(("hit",), principals.hits), (("miss",), principals.misses)]
+)
+
+
+def make_repository(backend: str) -> UserRepository:
+    if backend == "memory":
+        from app.crud.memory import MemoryUserRepository  # pylint: disable=import-outside-toplevel
+        return MemoryUserRepository()
+    
+    from app.crud.postgres import PostgresUserRepository  # pylint: disable=import-outside-toplevel
+    return PostgresUserRepository()
+
+
+class UserLoader:
+    
+    def __init__(self, repo: UserRepository, window: float = 0.002, max_batch: int = 100) -> None:
+        self.repo      = repo
+        self.window    = window
+        self.max_batch = max_batch
+        self._inflight: Dict[UUID4, "asyncio.Future[Optional[Row]]"] = {}
+        self._queued:   Dict[UUID4, "asyncio.Future[Optional[Row]]"] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def load(self, _id: UUID4) -> Optional[Row]:
+        fut = self._inflight.get(_id)
+        if not fut:
+            loop = asyncio.get_running_loop()
+            fut = self._inflight[_id] = self._queued[_id] = loop.create_future()
+            if len(self._queued) >= self.max_batch:
+                self.flush()
+            elif not self._timer:
+                self._timer = loop.call_later(self.window, self.flush)
+        return await asyncio.shield(fut)
+
+    def flush(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+        batch, self._queued, self._timer = self._queued, {}, None
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[UUID4, "asyncio.Future[Optional[Row]]"]) -> None:
+        LOADER_BATCH.observe(len(batch))
+        try:
+            with DB_LATENCY.time("get" if len(batch) == 1 else "get_batch"):
+                if len(batch) == 1:
+                    row = await self.repo.get(next(iter(batch)))
+                    rows = [row] if row else []
+                else:
+                    rows = await self.repo.get_batch(list(batch))
+            found = {r["id"]: r for r in rows}
+            for _id, fut in batch.items():
+                if not fut.done():
+                    fut.set_result(found.get(_id))
+        except Exception as e:  # pylint: disable=broad-except
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            for _id in batch:
+                self._inflight.pop(_id, None)
+
 
 class UserCRUD:
     
+    def __init__(self, repo: UserRepository, loader: Optional[UserLoader] = None) -> None:
+        self.repo   = repo
+        self.loader = loader
+    
     async def create(self, reg_data: UsrIn) -> Optional[UserAutoAssigned]:
         _id  = uuid4()
         _now = datetime.utcnow()
         
-        q = users.insert().values(
+        row = dict(
             id=_id,
             created_at=_now,
             updated_at=_now,
             username=reg_data.username, 
             email=reg_data.email,  
-            password=pass_manager.hash(reg_data.password),
+            password=await hasher.hash(reg_data.password),
             active=True,
             admin=reg_data.admin,
         )
         
         try:    
-            await db.execute(q)
-        except UniqueViolationError:
+            with DB_LATENCY.time("create"):
+                await self.repo.insert(row)
+        except Conflict:
             return None
         
+        recent_writes.set(_id, True)
         return {"id": _id, "created_at": _now, "updated_at": _now}
+    
+    async def create_many(self, reg_data: Sequence[UsrIn]) -> List[Optional[UserAutoAssigned]]:
+        hashes = await hasher.hash_many([r.password for r in reg_data])
+        _now   = datetime.utcnow()
+        
+        rows = [
+            {
+                "id": uuid4(),
+                "created_at": _now,
+                "updated_at": _now,
+                "username": r.username,
+                "email": r.email,
+                "password": pwd,
+                "active": True,
+                "admin": r.admin,
+            } 
+            for r, pwd in zip(reg_data, hashes)
+        ]
+        
+        with DB_LATENCY.time("create_many"):
+            created = await self.repo.insert_many(rows)
+        for _id in created:
+            recent_writes.set(_id, True)
+        
+        return [
+            {"id": r["id"], "created_at": _now, "updated_at": _now} if r["id"] in created else None
+            for r in rows
+        ]
+
+    def pin(self, _id: UUID4) -> None:
+        pinned.set(recent_writes.get(_id) is not None)
+
+    def fresh(self, _id: UUID4) -> bool:
+        return pinned.get() or recent_writes.get(_id) is not None
 
-    async def get(self, _id: Optional[UUID4] = None, username: str = "") -> Optional[Record]:
-        q = users.select().where(users.c.id == _id)
-        if username: 
-            q = users.select().where(users.c.username == username) 
-        return await db.fetch_one(q)
+    def remember(self, _id: UUID4, found: Optional[Row]) -> None:
+        seen = identities.get()
+        if seen is not None:
+            seen[_id] = found
+
+    async def load(self, _id: UUID4) -> Optional[Row]:
+        fresh = self.fresh(_id)
+        if self.loader and not fresh:
+            return await self.loader.load(_id)
+        with DB_LATENCY.time("get"):
+            return await self.repo.get(_id, fresh=fresh)
+
+    async def get(self, _id: Optional[UUID4] = None, username: str = "") -> Optional[Row]:
+        seen = identities.get()
+        if seen is not None and _id in seen:
+            return seen[_id]
         
-    async def get_many(self, skip: int, limit: int) -> Sequence[Optional[Record]]:
-        q = users.select().offset(skip).limit(limit)
-        return await db.fetch_all(q)
+        if username:
+            with DB_LATENCY.time("get"):
+                return await self.repo.get_by_username(username)
+        found = await self.load(_id) if _id else None
+        
+        if seen is not None and _id:
+            seen[_id] = found
+        return found
     
-    async def delete(self, id: UUID4) -> Optional[bool]:
-        q = users.delete().where(users.c.id == id).returning(True)
-        return await db.execute(q)
+    async def get_batch(self, ids: Sequence[UUID4]) -> List[Optional[Row]]:
+        seen = identities.get()
+        known = seen if seen is not None else {}
+        wanted = [_id for _id in dict.fromkeys(ids) if _id not in known]
+        if wanted:
+            with DB_LATENCY.time("get_batch"):
+                rows = await self.repo.get_batch(wanted, fresh=any(self.fresh(_id) for _id in wanted))
+            found = {r["id"]: r for r in rows}
+            known.update({_id: found.get(_id) for _id in wanted})
+        return [known[_id] for _id in ids]
 
-    async def update(self, _id: UUID4, upd_data: UserInfoUpd) -> bool:
-        success = True
+    async def get_cached(self, _id: UUID4) -> Optional[Row]:
+        return await principals.get_or_load(_id, lambda: self.get(_id))
+
+    def peek(self, _id: UUID4) -> Optional[Row]:
+        seen = identities.get()
+        if seen is not None and _id in seen:
+            return seen[_id]
+        return None if self.fresh(_id) else principals.get(_id)
         
-        q, vals = users.update().where(users.c.id == _id), {}
+    async def get_many(
+        self, limit: int, after: Optional[PageKey] = None, skip: int = 0, where: Optional[UserFilter] = None
+    ) -> Sequence[Optional[Row]]:
+        with DB_LATENCY.time("get_many"):
+            return await self.repo.get_many(limit, after, skip, fresh=pinned.get(), where=where)
+    
+    def iterate(
+        self, 
+        created_since: Optional[datetime] = None, 
+        created_until: Optional[datetime] = None,
+        updated_since: Optional[datetime] = None, 
+        updated_until: Optional[datetime] = None,
+    ) -> AsyncGenerator[Row, None]:
+        return self.repo.iterate((created_since, created_until), (updated_since, updated_until))
+    
+    async def delete(self, id: UUID4) -> Optional[bool]:
+        with DB_LATENCY.time("delete"):
+            deleted = await self.repo.delete(id)
+        self.remember(id, None)
+        principals.pop(id)
+        revoked.revoke(id)
+        recent_writes.set(id, True)
+        return deleted
+
+    async def update(self, _id: UUID4, upd_data: UserInfoUpd, updated_at: Optional[datetime] = None) -> Optional[bool]:
+        success: Optional[bool] = True
+        vals = {}
        
         if upd_data.email:
             vals["email"] = upd_data.email
         if upd_data.username:
             vals["username"] = upd_data.username 
         if upd_data.password:
-            vals["password"] = pass_manager.hash(upd_data.password)
+            vals["password"] = await hasher.hash(upd_data.password)
         vals["updated_at"] = datetime.utcnow()
         
         try:
-            await db.execute(q, vals)
-        except UniqueViolationError:
+            with DB_LATENCY.time("update"):
+                updated = await self.repo.update(_id, vals, updated_at)
+            success = True if updated else None
+            self.remember(_id, updated)
+        except Conflict:
             success = False
 
+        principals.pop(_id)
+        revoked.revoke(_id)
+        recent_writes.set(_id, True)
         return success
     
+    async def rehash(self, _id: UUID4, hashed: str) -> None:
+        with DB_LATENCY.time("rehash"):
+            self.remember(_id, await self.repo.update(_id, {"password": hashed}))
+        principals.pop(_id)
+        recent_writes.set(_id, True)
+
     async def deactivate(self, _id: UUID4) -> None:
-        q = users.update().where(users.c.id == _id)
         vals = {"active": False, "updated_at": datetime.utcnow()}
-        await db.execute(q, vals)
+        with DB_LATENCY.time("deactivate"):
+            self.remember(_id, await self.repo.update(_id, vals))
+        principals.pop(_id)
+        revoked.revoke(_id)
+        recent_writes.set(_id, True)
         
     async def purge(self) -> None:
-        await db.execute(users.delete())
+        with DB_LATENCY.time("purge"):
+            await self.repo.purge()
+        principals.clear()
+        revoked.clear()
+        recent_writes.clear()
     
     
-user = UserCRUD()
+def make_user_crud() -> UserCRUD:
+    repo = make_repository(settings.user_backend)
+    if not settings.user_loader:
+        return UserCRUD(repo)
+    return UserCRUD(repo, UserLoader(repo, settings.user_loader_window_ms / 1000, settings.user_loader_max_batch))
+
+
+user = make_user_crud()
@@ -1,5 +1,80 @@
-from databases import Database
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
 
-from app.config import get_conn_url
+import asyncpg
+from asyncpg import Connection, Pool
 
-db = Database(str(get_conn_url()))
+from app.config import get_conn_url, settings
+from app.metrics import Gauge, Histogram, Samples
+
+PRIMARY = "primary"
+
+
+def pool_options() -> Dict[str, Any]:
+    return {
+        "min_size": settings.db_pool_min_size,
+        "max_size": settings.db_pool_max_size,
+        "max_queries": settings.db_conn_max_queries,
+        "max_inactive_connection_lifetime": settings.db_conn_idle_lifetime,
+        "server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)},
+    }
+
+
+def dsn(replica: str = "") -> str:
+    return str(get_conn_url(replica=replica).set(drivername="postgresql"))
+
+
+dsns: Dict[str, str] = {PRIMARY: dsn(), **{host: dsn(host) for host in settings.postgres_replicas}}
+pools: Dict[str, Optional[Pool]] = dict.fromkeys(dsns)
+_replicas = itertools.cycle([name for name in pools if name != PRIMARY] or [PRIMARY])
+
+
+async def connect() -> None:
+    for name, url in dsns.items():
+        if pools[name] is None:
+            pools[name] = await asyncpg.create_pool(url, **pool_options())
+
+
+async def disconnect() -> None:
+    for name, pool in pools.items():
+        if pool is not None:
+            await pool.close()
+        pools[name] = None
+
+
+def reader(fresh: bool = False) -> str:
+    return PRIMARY if fresh else next(_replicas)
+
+
+@asynccontextmanager
+async def acquire(name: str = PRIMARY) -> AsyncIterator[Connection]:
+    pool = raw_pool(name)
+    if pool is None:
+        raise RuntimeError(f"database {name!r} is not connected")
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        POOL_WAIT.observe(time.perf_counter() - started, name)
+        yield conn
+
+
+def raw_pool(name: str = PRIMARY) -> Optional[Pool]:
+    return pools[name]
+
+
+def pool_usage() -> Samples:
+    for name in pools:
+        pool = raw_pool(name)
+        if pool is None:
+            continue
+        idle = pool.get_idle_size()
+        yield (name, "busy"), pool.get_size() - idle
+        yield (name, "idle"), idle
+        yield (name, "max"), pool.get_max_size()
+
+
+DB_POOL   = Gauge(
+    "db_pool_connections", "Database pool connections by pool and state.", ("pool", "state"), fn=pool_usage
+)
+POOL_WAIT = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection.", ("pool",))
@@ -0,0 +1,48 @@
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from sqlalchemy.dialects.postgresql import pypostgresql
+from sqlalchemy.sql import ClauseElement
+
+from app.crud.repository import Row
+from app.db.session import PRIMARY, acquire
+
+DIALECT = pypostgresql.dialect(paramstyle="pyformat")
+DIALECT.implicit_returning = True
+
+
+class Statement:
+
+    def __init__(self, query: ClauseElement) -> None:
+        compiled = query.compile(dialect=DIALECT, compile_kwargs={"render_postcompile": True})
+        self.names      = sorted(compiled.params)
+        self.sql        = compiled.string % {name: f"${i}" for i, name in enumerate(self.names, start=1)}
+        self.defaults   = compiled.params
+        self.processors = compiled._bind_processors  # pylint: disable=protected-access
+
+    def args(self, params: Dict[str, Any]) -> List[Any]:
+        values = [params.get(name, self.defaults[name]) for name in self.names]
+        return [
+            self.processors[name](v) if name in self.processors else v
+            for name, v in zip(self.names, values)
+        ]
+
+    async def fetch_one(self, using: str = PRIMARY, **params: Any) -> Optional[Row]:
+        async with acquire(using) as conn:
+            rec = await conn.fetchrow(self.sql, *self.args(params))
+        return Row(rec.items()) if rec else None
+
+    async def fetch_all(self, using: str = PRIMARY, **params: Any) -> List[Row]:
+        async with acquire(using) as conn:
+            recs = await conn.fetch(self.sql, *self.args(params))
+        return [Row(rec.items()) for rec in recs]
+
+    async def execute(self, using: str = PRIMARY, **params: Any) -> Any:
+        async with acquire(using) as conn:
+            return await conn.fetchval(self.sql, *self.args(params))
+
+    async def iterate(self, using: str = PRIMARY, **params: Any) -> AsyncGenerator[Row, None]:
+        """Holds a pooled connection until exhausted or closed; callers that may stop early must `aclose()` it."""
+        async with acquire(using) as conn:
+            async with conn.transaction():
+                async for rec in conn.cursor(self.sql, *self.args(params)):
+                    yield Row(rec.items())
@@ -1,3 +1,151 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple
+
 from passlib.context import CryptContext  # type: ignore
 
+from app.config import settings
+from app.metrics import Counter, Gauge, Histogram
+
 pass_manager = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+MIN_ROUNDS   = 4
+MAX_ROUNDS   = 31
+PROBE_ROUNDS = 8
+WARM_UP_PASS = "warm-up"
+
+HASH_LATENCY  = Histogram("password_hash_seconds", "Time a worker spends hashing or verifying a password.", ("op",))
+HASH_WAIT     = Histogram("password_hash_wait_seconds", "Time a hash/verify call waits for a free worker.", ("op",))
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Hash/verify calls rejected because the queue was full.", ("op",)
+)
+HASH_DEPTH    = Gauge(
+    "password_hash_queue_depth", "Hash/verify calls waiting or running.", fn=lambda: [((), hasher.depth)]
+)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash(secret: str) -> str:
+    return pass_manager.hash(secret)
+
+
+def _verify(secret: str, hashed: str) -> bool:
+    return pass_manager.verify(secret, hashed)
+
+
+def _verify_and_update(secret: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return pass_manager.verify_and_update(secret, hashed)
+
+
+def _timed(fn: Callable[..., Any], *args: str) -> Tuple[float, Any]:
+    started = time.perf_counter()
+    result  = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def use_rounds(rounds: Optional[int]) -> None:
+    if rounds:
+        pass_manager.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+
+
+def hash_seconds(rounds: int, samples: int = 3) -> float:
+    handler = pass_manager.handler("bcrypt").using(rounds=rounds)
+    best = math.inf
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash("calibration")
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def calibrate(budget_ms: float) -> int:
+    probe = hash_seconds(PROBE_ROUNDS)
+    rounds = PROBE_ROUNDS + math.floor(math.log2(budget_ms / 1000 / probe))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+
+class PassHasher:
+    def __init__(
+        self, kind: str = "process", workers: Optional[int] = None, queue_size: int = 64, rounds: Optional[int] = None
+    ) -> None:
+        self.kind       = kind
+        self.workers    = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.rounds     = rounds
+        self.depth      = 0
+        self._executor: Optional[Executor] = None
+        self._freed: Deque["asyncio.Future[None]"] = deque()
+
+    def start(self) -> None:
+        if self._executor:
+            return
+        use_rounds(self.rounds)
+        pool = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+        self._executor = pool(max_workers=self.workers, initializer=use_rounds, initargs=(self.rounds,))
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    async def warm_up(self) -> None:
+        hashed = await self.hash(WARM_UP_PASS)
+        await asyncio.gather(*(self.verify(WARM_UP_PASS, hashed) for _ in range(min(self.workers, self.queue_size))))
+
+    async def hash(self, secret: str) -> str:
+        return await self._run("hash", _hash, secret)
+
+    async def hash_many(self, secrets: Sequence[str]) -> List[str]:
+        hashes: List[str] = []
+        for i in range(0, len(secrets), self.workers):
+            batch = secrets[i:i + self.workers]
+            hashes.extend(await asyncio.gather(*(self._run("hash", _hash, s, wait=True) for s in batch)))
+        return hashes
+
+    async def verify(self, secret: str, hashed: str) -> bool:
+        return await self._run("verify", _verify, secret, hashed)
+
+    async def verify_and_update(self, secret: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._run("verify", _verify_and_update, secret, hashed)
+
+    async def _slot(self) -> None:
+        while self.depth >= self.queue_size:
+            freed = asyncio.get_running_loop().create_future()
+            self._freed.append(freed)
+            await freed
+
+    def _release(self) -> None:
+        self.depth -= 1
+        while self._freed:
+            freed = self._freed.popleft()
+            if not freed.done():
+                freed.set_result(None)
+                break
+
+    async def _run(self, op: str, fn: Callable[..., Any], *args: str, wait: bool = False) -> Any:
+        self.start()
+        started = time.perf_counter()
+        if wait:
+            await self._slot()
+        elif self.depth >= self.queue_size:
+            HASH_REJECTED.inc(op)
+            raise HasherBusy()
+        
+        self.depth += 1
+        try:
+            took, result = await asyncio.get_running_loop().run_in_executor(self._executor, _timed, fn, *args)
+        finally:
+            self._release()
+        HASH_LATENCY.observe(took, op)
+        HASH_WAIT.observe(max(0.0, time.perf_counter() - started - took), op)
+        return result
+
+
+hasher = PassHasher(settings.hash_pool_kind, settings.hash_workers, settings.hash_queue_size, settings.hash_rounds)
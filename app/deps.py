@@ -1,16 +1,20 @@
-from typing import List, Optional
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Union
 from uuid import UUID
 
-from databases.backends.postgres import Record as DBRecord
-from fastapi import Depends, HTTPException, Path
+from fastapi import Depends, Header, HTTPException, Path, Query
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jose import JWTError, jwt  # type: ignore
 from pydantic import UUID4
 from pydantic import BaseModel as BaseSchema
 from pydantic import ValidationError, validator
 
+from app.cache import TTLCache
 from app.config import settings
-from app.crud.users import user
+from app.crud.repository import Row
+from app.crud.users import revoked, user
+from app.metrics import Counter, Histogram
 
 NO_PERMISSIONS = "Not authorized to perform this operation."
 INVALID_TOKEN  = "Could not validate credentials."
@@ -18,33 +22,93 @@ LACKING_PERMS  = "Operation out of permissions scope."
 INV_ADMIN_TKN  = "Could not validate admin credentials."
 USER_INACTIVE  = "User inactive."
 
+REJECTED = "rejected"
+
+tokens: TTLCache[Union["TokenData", str]] = TTLCache(settings.token_cache_size)
+
+TOKEN_DECODE = Histogram("jwt_decode_seconds", "Time to turn a bearer token into TokenData.", ("cache",))
+TOKEN_CACHE  = Counter(
+    "token_cache_requests_total", "Decoded-token cache lookups by result.", ("result",),
+    fn=lambda: [(("hit",), tokens.hits), (("miss",), tokens.misses)]
+)
+
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl='token', 
     scopes={"users:rw": "Read, update, delete user."}
 )
 
 
+@dataclass(frozen=True)
+class Principal:
+    id:     UUID4
+    active: bool
+    admin:  bool
+
+
+AuthedUser = Union[Row, Principal]
+
+
 class TokenData(BaseSchema):
     id     : UUID4
     scopes : List[Optional[str]] = []
+    iat    : Optional[int]  = None
+    active : Optional[bool] = None
+    admin  : Optional[bool] = None
+    
+    @property
+    def trusted_state(self) -> bool:
+        return (
+            settings.stateless_auth and None not in (self.iat, self.active, self.admin) 
+            and not revoked.is_revoked(self.id, self.iat)  # type: ignore
+        )
     
     @validator("id", pre=True)
     def is_uuid_string(cls, _id):
         return UUID(_id)
 
 
-async def usr_or_401(scopes: SecurityScopes, tkn: str = Depends(oauth2_scheme)) -> DBRecord:
+def decode_token(tkn: str) -> Optional[TokenData]:
+    started = time.perf_counter()
+    cached = tokens.get(tkn)
+    if cached is not None:
+        TOKEN_DECODE.observe(time.perf_counter() - started, "hit")
+        return None if isinstance(cached, str) else cached
+    
+    try:
+        claims = jwt.decode(tkn, settings.secret_key, [settings.algo])
+        tkn_data = TokenData(
+            id=claims.get("sub"), 
+            scopes=claims.get("scopes"), 
+            iat=claims.get("iat"), 
+            active=claims.get("active"), 
+            admin=claims.get("admin"),
+        )
+    except (JWTError, ValidationError):
+        tokens.set(tkn, REJECTED, settings.token_negative_ttl)
+        TOKEN_DECODE.observe(time.perf_counter() - started, "miss")
+        return None
+    
+    if "exp" in claims:
+        tokens.set(tkn, tkn_data, claims["exp"] - time.time())
+    TOKEN_DECODE.observe(time.perf_counter() - started, "miss")
+    return tkn_data
+
+
+async def usr_or_401(scopes: SecurityScopes, tkn: str = Depends(oauth2_scheme)) -> AuthedUser:
     exc_headers = {"WWW-Authenticate": "Bearer"}
     if scopes.scopes:
         exc_headers = {"WWW-Authenticate": f"Bearer scope='{scopes.scope_str}'"}
         
-    try:
-        claims = jwt.decode(tkn, settings.secret_key, [settings.algo])
-        tkn_data = TokenData(id=claims.get("sub"), scopes=claims.get("scopes"))
-    except (JWTError, ValidationError) as e:
-        raise HTTPException(401, INVALID_TOKEN, exc_headers) from e
+    tkn_data = decode_token(tkn)
+    if not tkn_data:
+        raise HTTPException(401, INVALID_TOKEN, exc_headers)
 
-    u = await user.get(tkn_data.id)
+    user.pin(tkn_data.id)  # type: ignore
+    u: Optional[AuthedUser]
+    if tkn_data.trusted_state:
+        u = Principal(tkn_data.id, tkn_data.active, tkn_data.admin)  # type: ignore
+    else:
+        u = await user.get_cached(tkn_data.id)
     if not u:
         raise HTTPException(401, INVALID_TOKEN, exc_headers)
 
@@ -55,26 +119,31 @@ async def usr_or_401(scopes: SecurityScopes, tkn: str = Depends(oauth2_scheme))
     return u
     
     
-async def active_usr_or_400(u: DBRecord = Depends(usr_or_401)) -> DBRecord:
+async def active_usr_or_400(u: AuthedUser = Depends(usr_or_401)) -> AuthedUser:
     if not u.active:
         raise HTTPException(400, USER_INACTIVE)
     return u
 
 
-async def has_perms_or_403(id: UUID4 = Path(), u: DBRecord = Depends(active_usr_or_400)) -> None:
+async def has_perms_or_403(id: UUID4 = Path(), u: AuthedUser = Depends(active_usr_or_400)) -> None:
     is_obj_owner_or_admin = u.id == id or u.admin
     if not is_obj_owner_or_admin:
         raise HTTPException(403, NO_PERMISSIONS)
 
 
-async def usr_or_403(id: UUID4 = Path(), u: DBRecord = Depends(active_usr_or_400)) -> DBRecord:
+async def usr_or_403(id: UUID4 = Path(), u: AuthedUser = Depends(active_usr_or_400)) -> AuthedUser:
     is_obj_owner_or_admin = u.id == id or u.admin
     if not is_obj_owner_or_admin:
         raise HTTPException(403, NO_PERMISSIONS)  
     return u
 
 
-async def is_admin_or_403(u: DBRecord = Depends(active_usr_or_400)) -> None:
+async def ids_perms_or_403(ids: List[UUID4] = Query(), u: AuthedUser = Depends(active_usr_or_400)) -> None:
+    if not u.admin and any(_id != u.id for _id in ids):
+        raise HTTPException(403, NO_PERMISSIONS)
+
+
+async def is_admin_or_403(u: AuthedUser = Depends(active_usr_or_400)) -> None:
     if not u.admin:
         raise HTTPException(403, NO_PERMISSIONS)
     
@@ -83,3 +152,7 @@ async def check_admin_tkn(auth_header_value: str) -> None:
     apart = auth_header_value.split(" ")
     if len(apart) != 2 or apart[0].capitalize() != 'Token' or apart[1] != settings.admin_key:
         raise HTTPException(401, INV_ADMIN_TKN, {"WWW-Authenticate": "Token"})
+
+
+async def admin_tkn_or_401(authorization: str = Header(default="")) -> None:
+    await check_admin_tkn(authorization)
@@ -0,0 +1,25 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+identities: ContextVar[Optional[Dict[Any, Any]]] = ContextVar("identities", default=None)
+pinned:     ContextVar[bool] = ContextVar("pinned", default=False)
+
+
+class IdentityMapMiddleware:
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token, pin_token = identities.set({}), pinned.set(False)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pinned.reset(pin_token)
+            identities.reset(token)
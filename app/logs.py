@@ -0,0 +1,104 @@
+import copy
+import json
+import logging
+import queue
+from logging.config import fileConfig
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Mapping, Optional
+
+from app.config import settings
+from app.metrics import Counter
+
+LOG_DROPPED     = Counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full.", ("level",)
+)
+LOG_SAMPLED_OUT = Counter("log_records_sampled_out_total", "Expected HTTP error logs skipped by sampling.", ("status",))
+
+RECORD_FIELDS = ("levelname", "name", "process", "thread")
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "message": record.getMessage()}
+        entry.update((f, getattr(record, f)) for f in RECORD_FIELDS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, keep the traceback in exc_text for the listener's formatters.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(record.levelname)
+
+
+class Sampler:
+
+    def __init__(self, every: Mapping[int, int]) -> None:
+        self.every = every
+        self.seen: Dict[int, int] = {}
+
+    def keep(self, status: int) -> bool:
+        n = self.every.get(status, 1)
+        if n <= 1:
+            return True
+        seen = self.seen[status] = self.seen.get(status, 0) + 1
+        if seen % n == 1:
+            return True
+        LOG_SAMPLED_OUT.inc(str(status))
+        return False
+
+
+class QueuedLogging:
+
+    def __init__(self, config: str = "", queue_size: int = 10_000, json_format: bool = False) -> None:
+        self.config      = config
+        self.queue_size  = queue_size
+        self.json_format = json_format
+        self._handler:  Optional[QueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+
+    def start(self) -> None:
+        if self._listener or not self.config:
+            return
+        fileConfig(self.config, disable_existing_loggers=False)
+        root = logging.getLogger()
+        handlers: List[logging.Handler] = root.handlers[:]
+        for handler in handlers:
+            root.removeHandler(handler)
+            if self.json_format:
+                handler.setFormatter(JSONFormatter())
+
+        records: "queue.Queue[logging.LogRecord]" = queue.Queue(self.queue_size)
+        self._handler  = DroppingQueueHandler(records)
+        self._listener = QueueListener(records, *handlers, respect_handler_level=True)
+        root.addHandler(self._handler)
+        self._listener.start()
+
+    def stop(self) -> None:
+        if not self._listener:
+            return
+        logging.getLogger().removeHandler(self._handler)  # type: ignore
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._handler, self._listener = None, None
+
+
+pipeline = QueuedLogging(settings.log_config, settings.log_queue_size, settings.log_json)
+sampler  = Sampler(settings.log_sample_every)
@@ -5,38 +5,71 @@ from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException
 
-from app.db.session import db
-from app.routers import auth, files, users
+from app.config import settings
+from app.crud.users import user
+from app.db.utils import HasherBusy, calibrate, hasher
+from app.identity import IdentityMapMiddleware
+from app.logs import pipeline, sampler
+from app.metrics import MetricsMiddleware
+from app.routers import auth, files, health, metrics, users
+from app.warmup import STARTUP, since_boot, warm_up
 
 logger = logging.getLogger(name=__name__)
 
-ORIGINS = ["http://127.0.0.1"]
-HOSTS   = ["*"]
+ORIGINS     = ["http://127.0.0.1"]
+HOSTS       = ["*"]
+HASHER_BUSY = "Too many password checks in progress, retry shortly."
 
 app = FastAPI()
 
 app.add_middleware(CORSMiddleware, allow_origins=ORIGINS, max_age=300, allow_credentials=True)
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=HOSTS)
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(IdentityMapMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(files.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
+
+STARTUP.set(since_boot(), "import")
 
 
 @app.exception_handler(HTTPException)
 async def log_http_exception(request, exc):
-    logger.error('Exception ocurred: %s', repr(exc))
+    if sampler.keep(exc.status_code):
+        logger.error('Exception ocurred: %s', repr(exc))
     return await http_exception_handler(request, exc)
 
 
+@app.exception_handler(HasherBusy)
+async def reject_when_hasher_busy(request, exc):
+    return JSONResponse({"detail": HASHER_BUSY}, 503, {"Retry-After": "1"})
+
+
 @app.on_event("startup")
 async def startup():
-    await db.connect()
-    
+    pipeline.start()
+    await user.repo.connect()
+    if settings.hash_calibrate and not hasher.rounds:
+        hasher.rounds = calibrate(settings.hash_budget_ms)
+        logger.info("Password hashing calibrated to %d bcrypt rounds", hasher.rounds)
+    hasher.start()
+    if settings.warm_up:
+        await warm_up()
+    app.state.ready = True
+    STARTUP.set(since_boot(), "ready")
+    logger.info("Ready %.3fs after boot", since_boot())
+
 
 @app.on_event("shutdown")
 async def shutdown():
-    await db.disconnect()
\ No newline at end of file
+    app.state.ready = False
+    await user.repo.disconnect()
+    hasher.shutdown()
+    pipeline.stop()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+Labels  = Tuple[str, ...]
+Samples = Iterable[Tuple[Labels, float]]
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+registry: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Metric(ABC):
+    kind = "untyped"
+    
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> None:
+        self.name       = name
+        self.doc        = doc
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Exposition lines for the current values, without the HELP and TYPE header."""
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.doc}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(f"{line}\n" for line in self.samples())
+
+
+class CallbackMixin:
+    """One value per label set, either recorded in `values` or read from `fn` at scrape time."""
+    name:       str
+    labelnames: Labels
+    
+    def __init__(
+        self, name: str, doc: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], Samples]] = None
+    ) -> None:
+        super().__init__(name, doc, labelnames)  # type: ignore[call-arg]
+        self.values: Dict[Labels, float] = {}
+        self.fn = fn
+
+    def samples(self) -> Iterator[str]:
+        values = dict(self.fn()) if self.fn else self.values
+        for labels, v in values.items():
+            yield f"{self.name}{_fmt_labels(self.labelnames, labels)} {_fmt_value(v)}"
+
+
+class Counter(CallbackMixin, Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(CallbackMixin, Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(
+        self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts, total = self.values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {_fmt_value(total[0])}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {cumulative}"
+
+
+def render() -> str:
+    return "".join(m.render() for m in registry)
+
+
+class MetricsMiddleware:
+    
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.routes: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        
+        async def send_and_track(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_track)
+        finally:
+            route = self.route_of(scope)
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
+
+    def route_of(self, scope: Scope) -> str:
+        if not self.routes and "app" in scope:
+            self.routes = {getattr(r, "endpoint", r): getattr(r, "path", "") for r in scope["app"].routes}
+        return self.routes.get(scope.get("endpoint"), "unmatched")
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by method, route and status.", ("method", "route", "status")
+)
+HTTP_LATENCY  = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route.", ("method", "route")
+)
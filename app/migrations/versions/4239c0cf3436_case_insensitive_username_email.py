@@ -0,0 +1,53 @@
+"""case-insensitive username and email
+
+Revision ID: 4239c0cf3436
+Revises: cc4ec731a84e
+Create Date: 2026-10-18 11:02:47.519304+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = '4239c0cf3436'
+down_revision = 'cc4ec731a84e'
+branch_labels = None
+depends_on = None
+
+SHOWN_COLLISIONS = 20
+
+
+def collisions(col: str) -> str:
+    if context.is_offline_mode():
+        return ""
+    rows = op.get_bind().execute(sa.text(
+        f"SELECT lower({col}), array_agg({col} ORDER BY created_at) FROM users GROUP BY 1 HAVING count(*) > 1"
+    )).fetchall()
+    if not rows:
+        return ""
+    shown = "".join(f"\n  {folded}: {', '.join(values)}" for folded, values in rows[:SHOWN_COLLISIONS])
+    return f"\n{len(rows)} {col} value(s) differ only by case:{shown}"
+
+
+def upgrade() -> None:
+    found = collisions('username') + collisions('email')
+    if found:
+        raise RuntimeError(f"Rename all but one user in each group below and rerun the migration.{found}")
+    with op.get_context().autocommit_block():
+        for col in ('username', 'email'):
+            op.create_index(
+                f'ux_users_lower_{col}', 'users', [sa.text(f'lower({col})')], unique=True, postgresql_concurrently=True
+            )
+    op.drop_constraint('users_username_key', 'users', type_='unique')
+    op.drop_constraint('users_email_key', 'users', type_='unique')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for col in ('username', 'email'):
+            op.create_index(f'users_{col}_key', 'users', [col], unique=True, postgresql_concurrently=True)
+    op.execute('ALTER TABLE users ADD CONSTRAINT users_email_key UNIQUE USING INDEX users_email_key')
+    op.execute('ALTER TABLE users ADD CONSTRAINT users_username_key UNIQUE USING INDEX users_username_key')
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_users_lower_email', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ux_users_lower_username', table_name='users', postgresql_concurrently=True)
@@ -0,0 +1,48 @@
+"""user filter indexes
+
+Revision ID: 8d1f5a2c7b90
+Revises: 4239c0cf3436
+Create Date: 2026-10-18 13:24:05.118402+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8d1f5a2c7b90'
+down_revision = '4239c0cf3436'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_updated_at_id', 'users', ['updated_at', 'id'], postgresql_concurrently=True)
+        op.create_index(
+            'ix_users_admins', 'users', ['created_at', 'id'],
+            postgresql_where=sa.text('admin'), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_users_inactive', 'users', ['created_at', 'id'],
+            postgresql_where=sa.text('NOT active'), postgresql_concurrently=True,
+        )
+        for col in ('username', 'email'):
+            op.create_index(
+                f'ix_users_lower_{col}_pattern', 'users', [sa.text(f'lower({col}) text_pattern_ops')],
+                postgresql_concurrently=True,
+            )
+            op.create_index(
+                f'ix_users_lower_{col}_trgm', 'users', [sa.text(f'lower({col}) gin_trgm_ops')],
+                postgresql_using='gin', postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for col in ('email', 'username'):
+            op.drop_index(f'ix_users_lower_{col}_trgm', table_name='users', postgresql_concurrently=True)
+            op.drop_index(f'ix_users_lower_{col}_pattern', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_inactive', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_admins', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_updated_at_id', table_name='users', postgresql_concurrently=True)
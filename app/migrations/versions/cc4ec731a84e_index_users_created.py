@@ -0,0 +1,26 @@
+"""index users created_at id
+
+Revision ID: cc4ec731a84e
+Revises: 46569be94e3c
+Create Date: 2026-10-18 09:12:31.204113+00:00
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'cc4ec731a84e'
+down_revision = '46569be94e3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_created_at_id', table_name='users', postgresql_concurrently=True)
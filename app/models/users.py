@@ -1,5 +1,5 @@
 from email_validator import EMAIL_MAX_LENGTH
-from sqlalchemy import Boolean, Column, DateTime, String, Table
+from sqlalchemy import DDL, Boolean, Column, DateTime, Index, String, Table, event, func, text
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.db.base import metadata
@@ -11,9 +11,31 @@ users = Table(
     Column("id", UUID(as_uuid=True), primary_key=True),
     Column("created_at", DateTime(timezone=True), nullable=False),
     Column("updated_at", DateTime(timezone=True), nullable=False),
-    Column("username", String(NAME_MAX_LENGTH), nullable=False, unique=True),
-    Column("email", String(EMAIL_MAX_LENGTH), nullable=False, unique=True),
+    Column("username", String(NAME_MAX_LENGTH), nullable=False),
+    Column("email", String(EMAIL_MAX_LENGTH), nullable=False),
     Column("password", String(128), nullable=False),
     Column("active", Boolean, nullable=False, default=True),
-    Column("admin", Boolean, nullable=False, default=False)
+    Column("admin", Boolean, nullable=False, default=False),
+    Index("ix_users_created_at_id", "created_at", "id"),
+    Index("ix_users_updated_at_id", "updated_at", "id"),
+    Index("ix_users_admins", "created_at", "id", postgresql_where=text("admin")),
+    Index("ix_users_inactive", "created_at", "id", postgresql_where=text("NOT active")),
 )
+
+Index("ux_users_lower_username", func.lower(users.c.username), unique=True)
+Index("ux_users_lower_email", func.lower(users.c.email), unique=True)
+
+for col in (users.c.username, users.c.email):
+    Index(
+        f"ix_users_lower_{col.name}_pattern",
+        func.lower(col).label(f"lower_{col.name}"),
+        postgresql_ops={f"lower_{col.name}": "text_pattern_ops"},
+    )
+    Index(
+        f"ix_users_lower_{col.name}_trgm",
+        func.lower(col).label(f"lower_{col.name}"),
+        postgresql_using="gin",
+        postgresql_ops={f"lower_{col.name}": "gin_trgm_ops"},
+    )
+
+event.listen(users, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
@@ -0,0 +1,49 @@
+import time
+from typing import Dict, Iterator
+from uuid import UUID
+
+
+class RevocationFilter:
+    
+    def __init__(self, retention: float, bits: int = 1 << 16, hashes: int = 4) -> None:
+        self.retention = retention
+        self.bits      = bits
+        self.hashes    = hashes
+        self._filter   = bytearray(bits // 8)
+        self._revoked: Dict[UUID, float] = {}
+        self._pruned_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def revoke(self, key: UUID) -> None:
+        now = time.time()
+        if now - self._pruned_at > self.retention:
+            self.prune(now)
+        self._revoked[key] = now
+        self._add(key)
+
+    def is_revoked(self, key: UUID, issued_at: float) -> bool:
+        if not all(self._filter[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)):
+            return False
+        revoked_at = self._revoked.get(key)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def prune(self, now: float) -> None:
+        self._revoked = {k: t for k, t in self._revoked.items() if now - t <= self.retention}
+        self._filter = bytearray(self.bits // 8)
+        for key in self._revoked:
+            self._add(key)
+        self._pruned_at = now
+
+    def clear(self) -> None:
+        self._revoked.clear()
+        self._filter = bytearray(self.bits // 8)
+
+    def _add(self, key: UUID) -> None:
+        for pos in self._positions(key):
+            self._filter[pos >> 3] |= 1 << (pos & 7)
+
+    def _positions(self, key: UUID) -> Iterator[int]:
+        h1, h2 = key.int & 0xFFFFFFFFFFFFFFFF, key.int >> 64 | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
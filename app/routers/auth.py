@@ -1,23 +1,37 @@
+import math
 from copy import deepcopy
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Any, Dict
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt  # type: ignore
 
 from app.config import settings
 from app.crud.users import user
-from app.db.utils import pass_manager
+from app.db.utils import hasher
+from app.metrics import Counter
+from app.throttle import MemoryBucketStore, RateLimiter
 
 USER_INACTIVE      = "User inactive."
 INVALID_CREDS      = "Invalid username or password."
+TOO_MANY_ATTEMPTS  = "Too many login attempts, try again later."
 TOKEN_EXP_MINS     = 30
 COMMON_USER_SCOPES = ("users:rw", "users:r")
 
 usr_inactive  = {400: {"description": USER_INACTIVE}}
 inv_creds     = {401: {"description": INVALID_CREDS}}
+throttled     = {429: {"description": TOO_MANY_ATTEMPTS}}
+
+login_by_ip   = RateLimiter(
+    settings.login_ip_burst, settings.login_ip_per_min, MemoryBucketStore(settings.login_throttle_keys)
+)
+login_by_name = RateLimiter(
+    settings.login_user_burst, settings.login_user_per_min, MemoryBucketStore(settings.login_throttle_keys)
+)
+
+LOGIN_THROTTLED = Counter("login_throttled_total", "Login attempts rejected before verification, by bucket.", ("key",))
 
 
 router = APIRouter(tags=["auth"])
@@ -30,23 +44,40 @@ class Token:
 
 
 def gen_access_token_str(payload: Dict[str, Any], expires_in: int = TOKEN_EXP_MINS) -> str:
-    claims = deepcopy(payload)
-    claims.update({"exp": datetime.utcnow() + timedelta(minutes=expires_in)})
+    claims, now = deepcopy(payload), datetime.utcnow()
+    claims.update({"iat": now, "exp": now + timedelta(minutes=expires_in)})
     return jwt.encode(claims, settings.secret_key, settings.algo)
 
 
-@router.post("/token", status_code=201, response_model=Token, responses={**usr_inactive, **inv_creds})
-async def log_in(form_data: OAuth2PasswordRequestForm = Depends()):
+async def throttle_login(request: Request, username: str) -> None:
+    ip = request.client.host if request.client else ""
+    for key, limiter, value in (("ip", login_by_ip, ip), ("username", login_by_name, username.lower())):
+        wait = await limiter.hit(value)
+        if wait:
+            LOGIN_THROTTLED.inc(key)
+            raise HTTPException(429, TOO_MANY_ATTEMPTS, {"Retry-After": str(math.ceil(wait))})
+
+
+@router.post("/token", status_code=201, response_model=Token, responses={**usr_inactive, **inv_creds, **throttled})
+async def log_in(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    await throttle_login(request, form_data.username)
     u_found = await user.get(username=form_data.username)   
-    
-    if not u_found or not pass_manager.verify(form_data.password, u_found.password):
+    if not u_found:
         raise HTTPException(401, INVALID_CREDS, {"WWW-Authenticate": "Bearer"})
     
+    verified, new_hash = await hasher.verify_and_update(form_data.password, u_found.password)
+    if not verified:
+        raise HTTPException(401, INVALID_CREDS, {"WWW-Authenticate": "Bearer"})
     if not u_found.active:
         raise HTTPException(400, USER_INACTIVE)
+    if new_hash:
+        await user.rehash(u_found.id, new_hash)
 
-    if u_found.admin:
-        return Token(access_token=gen_access_token_str({"sub": str(u_found.id), "scopes": form_data.scopes}))
+    verified_scopes = form_data.scopes if u_found.admin else [i for i in form_data.scopes if i in COMMON_USER_SCOPES]
+    claims = {"sub": str(u_found.id), "scopes": verified_scopes}
+    
+    if settings.stateless_auth:
+        claims.update({"active": u_found.active, "admin": u_found.admin})
+        return Token(access_token=gen_access_token_str(claims, settings.stateless_token_exp_mins))
     
-    verified_scopes = [i for i in form_data.scopes if i in COMMON_USER_SCOPES]           
-    return Token(access_token=gen_access_token_str({"sub": str(u_found.id), "scopes": verified_scopes}))
+    return Token(access_token=gen_access_token_str(claims))
@@ -1,17 +1,52 @@
 from typing import List
 
-from fastapi import APIRouter, Form, UploadFile
+from fastapi import APIRouter, HTTPException, Request, Security
 from fastapi.responses import HTMLResponse
 
-router = APIRouter(prefix='/files', tags=["files"])
+from app import deps
+from app.config import settings
+from app.storage import MalformedUpload, StoredFile, UploadTooLarge, store_uploads
 
+UPLOAD_TOO_LARGE = "Upload exceeds the allowed size."
+NOT_MULTIPART    = "Expected a multipart/form-data body with files."
 
-@router.post("/", status_code=201)
-async def upload_files(files: List[UploadFile], username: str = Form()):
-    return {
-        "filenames": [f.filename for f in files],
-        "username": username
+too_large     = {413: {"description": UPLOAD_TOO_LARGE}}
+not_multipart = {400: {"description": NOT_MULTIPART}}
+upload_form   = {
+    "requestBody": {
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            }
+        },
+        "required": True,
     }
+}
+
+router = APIRouter(prefix='/files', tags=["files"])
+
+
+@router.post(
+    "/", 
+    status_code=201, 
+    response_model=List[StoredFile], 
+    responses={**too_large, **not_multipart}, 
+    openapi_extra=upload_form,
+)
+async def upload_files(request: Request, u: deps.AuthedUser = Security(deps.active_usr_or_400, scopes=["users:rw"])):
+    declared_size = request.headers.get("content-length", "")
+    if declared_size.isdigit() and int(declared_size) > settings.upload_max_request_size:
+        raise HTTPException(413, UPLOAD_TOO_LARGE)
+    
+    try:
+        return await store_uploads(request.headers.get("content-type", ""), request.stream(), str(u.id))
+    except UploadTooLarge as e:
+        raise HTTPException(413, UPLOAD_TOO_LARGE) from e
+    except MalformedUpload as e:
+        raise HTTPException(400, NOT_MULTIPART) from e
 
 
 @router.get("/")
@@ -29,7 +64,6 @@ async def get_files_upload_form():
             </head>
             <body>
                 <form action="/files/" enctype="multipart/form-data" method="post">
-                    <input name="username" type="text"></br>
                     <input name="files" type="file" multiple>
                     <input type="submit">
                 </form>  
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/health/live", include_in_schema=False)
+async def live():
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", include_in_schema=False)
+async def ready(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, 503)
+    return {"status": "ready"}
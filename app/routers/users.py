@@ -1,24 +1,48 @@
-from typing import List, Optional
+import binascii
+import csv
+import io
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Dict, List, Literal, Optional
+from uuid import UUID
 
-from databases.backends.postgres import Record as DBRecord
-from fastapi import APIRouter, Header, HTTPException, Security
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, Security
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import UUID4
 
 from app import deps
-from app.crud.users import user
+from app.config import settings
+from app.crud.users import PUBLIC_FIELDS, PageKey, Row, Stale, UserFilter, user
+from app.responses import FastJSONResponse
 from app.routers import auth
-from app.schemas.users import UserInfoUpd, UsrIn, UsrOut
-from app.db.utils import pass_manager
+from app.schemas.users import BulkRowOut, UserInfoUpd, UsrIn, UsrOut
+from app.db.utils import hasher
 
 
 CONFLICT       = "User with provided username or email already exists."
 USER_NOT_FOUND = "User not found."
+INVALID_CURSOR = "Invalid pagination cursor."
+BULK_TOO_BIG   = "Too many users in one request."
+STALE_VERSION  = "User was modified since the version given in If-Match."
+MAX_PAGE_SIZE  = 1000
+EXPORT_CHUNK   = 500
+EXPORT_FIELDS  = list(PUBLIC_FIELDS)
+EXPORT_TYPES   = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+OUT_FIELDS     = tuple(UsrOut.__fields__)
+EPOCH          = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND    = timedelta(microseconds=1)
 
 usr_inactive  = {400: {"description": auth.USER_INACTIVE}}
 unauthed      = {401: {"description": deps.INVALID_TOKEN}}
 adm_unauthed  = {401: {"description": deps.INV_ADMIN_TKN}}
 usr_not_found = {404: {"description": USER_NOT_FOUND}}
+inv_cursor    = {400: {"description": INVALID_CURSOR}}
+bulk_too_big  = {413: {"description": BULK_TOO_BIG}}
 conflict      = {409: {"description": CONFLICT}}
+not_modified  = {304: {"description": "User is unchanged since the version given in If-None-Match."}}
+stale         = {412: {"description": STALE_VERSION}}
 
 router = APIRouter()
 jwt_free = APIRouter(prefix="/users", tags=["users"])
@@ -35,33 +59,208 @@ async def add_user(reg_data: UsrIn, authorization: str = Header(default="")):
         raise HTTPException(409, CONFLICT)
     
     return {**reg_data.dict(), **auto_assigned_attrs} 
+
+
+async def bulk_size_or_413(request: Request) -> None:
+    try:
+        rows = await request.json()
+    except ValueError:
+        return
+    if isinstance(rows, list) and len(rows) > settings.bulk_max_size:
+        raise HTTPException(413, BULK_TOO_BIG)
+
+
+@jwt_free.post(
+    "/bulk", 
+    response_model=List[BulkRowOut], 
+    responses={**adm_unauthed, **bulk_too_big}, 
+    dependencies=[Depends(deps.admin_tkn_or_401), Depends(bulk_size_or_413)],
+)
+async def add_users(reg_data: List[UsrIn] = Body()):
+    auto_assigned = await user.create_many(reg_data)
+    return [
+        {"username": r.username, "status": "created" if attrs else "conflict", "id": attrs and attrs["id"]}
+        for r, attrs in zip(reg_data, auto_assigned)
+    ]
  
    
-@jwt_bound.get("/", response_model=List[Optional[UsrOut]], dependencies=[Security(deps.is_admin_or_403, scopes=["users:rw"])])
-async def list_users(skip: int = 0, limit: int =100):
-    return await user.get_many(skip, limit)
+def encode_cursor(u: Row) -> str:
+    return urlsafe_b64encode(f"{u.created_at.isoformat()}|{u.id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> PageKey:
+    try:
+        created_at, _id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(400, INVALID_CURSOR) from e
+
+
+def etag(u: Row) -> str:
+    return f'W/"{str(u.id).replace("-", "")}.{(u.updated_at - EPOCH) // MICROSECOND}"'
+
+
+def etag_matches(if_none_match: str, tag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return tag.removeprefix("W/") in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+
+def if_match_version(if_match: str, id: UUID) -> Optional[datetime]:
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        hex_id, micros = if_match.strip().removeprefix("W/").strip('"').split(".")
+        if UUID(hex_id) == id:
+            return EPOCH + int(micros) * MICROSECOND
+    except ValueError:
+        pass
+    raise HTTPException(412, STALE_VERSION)
+
+
+def missing(if_match: str) -> HTTPException:
+    if if_match:
+        return HTTPException(412, STALE_VERSION)
+    return HTTPException(404, USER_NOT_FOUND)
+
+
+def out_row(r: Optional[Row]) -> Optional[Dict[str, Any]]:
+    return r and {f: str(r[f]) if f == "id" else r[f] for f in OUT_FIELDS}
 
 
-@jwt_bound.get("/{id}", response_model=UsrOut, dependencies=[Security(deps.has_perms_or_403, scopes=["users:rw"])])
-async def get_user(id: UUID4):
+@jwt_bound.get(
+    "/", 
+    response_model=List[Optional[UsrOut]], 
+    response_class=FastJSONResponse, 
+    responses=inv_cursor, 
+    dependencies=[Security(deps.is_admin_or_403, scopes=["users:rw"])],
+)
+async def list_users(
+    request: Request, 
+    cursor: str = "", 
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE), 
+    skip: int = Query(default=0, ge=0, deprecated=True),
+    where: UserFilter = Depends(),
+):
+    page = await user.get_many(limit, decode_cursor(cursor) if cursor else None, skip, where)
+    response = FastJSONResponse([out_row(u) for u in page])
+    if len(page) == limit and page[-1]:
+        next_url = request.url.remove_query_params("skip").include_query_params(cursor=encode_cursor(page[-1]))
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def export_row(r: Row) -> Dict[str, Any]:
+    return {
+        k: v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, UUID) else v 
+        for k, v in zip(EXPORT_FIELDS, (r[f] for f in EXPORT_FIELDS))
+    }
+
+
+async def export_chunks(rows: AsyncGenerator[Row, None], fmt: str) -> AsyncGenerator[str, None]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, EXPORT_FIELDS) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+        
+    n = 0
+    async for r in rows:
+        if writer:
+            writer.writerow(export_row(r))
+        else:
+            buf.write(json.dumps(export_row(r)) + "\n")
+        
+        n += 1
+        if n == 1 or n % EXPORT_CHUNK == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    
+    yield buf.getvalue()
+
+
+@jwt_bound.get(
+    "/export", response_class=StreamingResponse, dependencies=[Security(deps.is_admin_or_403, scopes=["users:rw"])]
+)
+async def export_users(
+    fmt: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    created_since: Optional[datetime] = None,
+    created_until: Optional[datetime] = None,
+    updated_since: Optional[datetime] = None,
+    updated_until: Optional[datetime] = None,
+):
+    rows = user.iterate(created_since, created_until, updated_since, updated_until)
+    return StreamingResponse(
+        export_chunks(rows, fmt), 
+        media_type=EXPORT_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=users.{fmt}"},
+        background=BackgroundTask(rows.aclose),  # releases the connection if the client disconnects mid-stream
+    )
+
+
+@jwt_bound.get(
+    "/batch", 
+    response_model=List[Optional[UsrOut]], 
+    response_class=FastJSONResponse, 
+    responses=bulk_too_big, 
+    dependencies=[Security(deps.ids_perms_or_403, scopes=["users:rw"])],
+)
+async def get_users(ids: List[UUID4] = Query()):
+    if len(ids) > settings.batch_max_size:
+        raise HTTPException(413, BULK_TOO_BIG)
+    return FastJSONResponse([out_row(u) for u in await user.get_batch(ids)])
+
+
+@jwt_bound.get(
+    "/{id}", 
+    response_model=UsrOut, 
+    responses=not_modified, 
+    dependencies=[Security(deps.has_perms_or_403, scopes=["users:rw"])],
+)
+async def get_user(id: UUID4, response: Response, if_none_match: str = Header(default="")):
+    known = user.peek(id) if if_none_match else None
+    if known and etag_matches(if_none_match, etag(known)):
+        return Response(status_code=304, headers={"ETag": etag(known)})
+    
     u = await user.get(id)
     if not u:
         raise HTTPException(404, USER_NOT_FOUND)
+    
+    tag = etag(u)
+    if if_none_match and etag_matches(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    response.headers["ETag"] = tag
     return u
     
 
-@jwt_bound.put("/{id}", status_code=204, responses={**conflict, **auth.inv_creds})
-async def update_user(id: UUID4, upd_info: UserInfoUpd, u: DBRecord = Security(deps.usr_or_403, scopes=["users:rw"])):
-    user_obj_to_upd = await user.get(id)
-    if not user_obj_to_upd:
-        raise HTTPException(404, USER_NOT_FOUND)
-    
-    if upd_info.password and not pass_manager.verify(upd_info.oldpassword, user_obj_to_upd.password):
-        raise HTTPException(401, auth.INVALID_CREDS, {"WWW-Authenticate": "Bearer"})
+@jwt_bound.put("/{id}", status_code=204, responses={**conflict, **stale, **auth.inv_creds})
+async def update_user(
+    id: UUID4, 
+    upd_info: UserInfoUpd, 
+    response: Response, 
+    if_match: str = Header(default=""), 
+    u: deps.AuthedUser = Security(deps.usr_or_403, scopes=["users:rw"]),
+):
+    version = if_match_version(if_match, id)
+    if upd_info.password:
+        user_obj_to_upd = await user.get(id)
+        if not user_obj_to_upd:
+            raise missing(if_match)
+        if not await hasher.verify(upd_info.oldpassword or "", user_obj_to_upd.password):
+            raise HTTPException(401, auth.INVALID_CREDS, {"WWW-Authenticate": "Bearer"})
 
-    ok = await user.update(id, upd_info)
+    try:
+        ok = await user.update(id, upd_info, version)
+    except Stale as e:
+        raise HTTPException(412, STALE_VERSION) from e
+    if ok is None:
+        raise missing(if_match)
     if not ok:
         raise HTTPException(409, CONFLICT)
+    
+    updated = await user.get(id)
+    if updated:
+        response.headers["ETag"] = etag(updated)
 
 
 @jwt_bound.delete("/{id}", status_code=204, dependencies=[Security(deps.has_perms_or_403, scopes=["users:rw"])])
@@ -1,6 +1,6 @@
 import re
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Literal, Optional
 
 from pydantic import UUID4
 from pydantic import BaseModel as BaseSchema
@@ -65,6 +65,12 @@ class UsrIn(UserInfoBase):
     password:  PassStr
     password2: str
     
+    @validator("admin", pre=True)
+    def is_bool(cls, admin) -> bool:
+        if not isinstance(admin, bool):
+            raise ValueError(BOOL_EXPECTED)
+        return admin
+    
     @validator("password2")
     def pass_match(cls, password2, values) -> str:
         password = values.get("password")
@@ -103,6 +109,12 @@ class UsrOut(UserInfoBase):
         orm_mode = True
 
 
+class BulkRowOut(BaseSchema):
+    username: str
+    status:   Literal["created", "conflict"]
+    id:       Optional[UUID4] = None
+
+
 class UserDB(UsrOut): 
     password: str
     active:   bool
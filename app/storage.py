@@ -0,0 +1,190 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import IO, AsyncIterator, Awaitable, Callable, List, Optional
+from uuid import uuid4
+
+import anyio
+import multipart  # type: ignore
+from multipart.exceptions import MultipartParseError  # type: ignore
+from multipart.multipart import parse_options_header  # type: ignore
+
+from app.config import settings
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class MalformedUpload(Exception):
+    pass
+
+
+@dataclass
+class StoredFile:
+    id:           str
+    filename:     str
+    content_type: str
+    size:         int = 0
+    sha256:       str = ""
+
+
+def _write(fh: IO[bytes], digest: "hashlib._Hash", chunk: bytes) -> None:
+    digest.update(chunk)
+    fh.write(chunk)
+
+
+class UploadSink:
+    
+    def __init__(self, dest: Path, max_file_size: int, chunk_size: int) -> None:
+        self.dest          = dest
+        self.max_file_size = max_file_size
+        self.chunk_size    = chunk_size
+        self.stored: List[StoredFile] = []
+        self._fh: Optional[IO[bytes]] = None
+        self._digest = hashlib.sha256()
+        self._buf    = bytearray()
+
+    async def open(self, filename: str, content_type: str) -> None:
+        await anyio.to_thread.run_sync(lambda: self.dest.mkdir(parents=True, exist_ok=True))
+        f = StoredFile(uuid4().hex, filename, content_type)
+        self._fh = await anyio.to_thread.run_sync(open, self.dest / f.id, "wb")
+        self._digest = hashlib.sha256()
+        self.stored.append(f)
+
+    async def write(self, data: bytes) -> None:
+        f = self.stored[-1]
+        f.size += len(data)
+        if f.size > self.max_file_size:
+            raise UploadTooLarge(f.filename)
+        
+        self._buf += data
+        if len(self._buf) >= self.chunk_size:
+            await self._flush()
+
+    async def close(self) -> None:
+        await self._flush()
+        if self._fh:
+            await anyio.to_thread.run_sync(self._fh.close)
+        self._fh = None
+        self.stored[-1].sha256 = self._digest.hexdigest()
+
+    async def discard(self) -> None:
+        if self._fh:
+            await anyio.to_thread.run_sync(self._fh.close)
+        self._fh = None
+        for f in self.stored:
+            await anyio.to_thread.run_sync(lambda p: p.unlink(missing_ok=True), self.dest / f.id)
+
+    async def _flush(self) -> None:
+        if self._fh and self._buf:
+            chunk, self._buf = bytes(self._buf), bytearray()
+            await anyio.to_thread.run_sync(_write, self._fh, self._digest, chunk)
+
+
+class PartHeaders:
+    
+    def __init__(self) -> None:
+        self.disposition  = b""
+        self.content_type = b""
+        self._field = b""
+        self._value = b""
+
+    def begin(self) -> None:
+        self.disposition, self.content_type = b"", b""
+
+    def field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def end(self) -> None:
+        name = self._field.lower()
+        if name == b"content-disposition":
+            self.disposition = self._value
+        elif name == b"content-type":
+            self.content_type = self._value
+        self._field, self._value = b"", b""
+
+    def filename(self) -> str:
+        _, opts = parse_options_header(self.disposition)
+        return os.path.basename(opts.get(b"filename", b"").decode(errors="replace"))
+
+
+class MultipartUpload:
+    
+    def __init__(self, boundary: bytes, sink: UploadSink, max_request_size: int) -> None:
+        self.sink             = sink
+        self.max_request_size = max_request_size
+        self.headers          = PartHeaders()
+        self.in_file          = False
+        self.done             = False
+        self._pending: List[Callable[[], Awaitable[None]]] = []
+        self._parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self.headers.begin,
+            "on_header_field": self.headers.field,
+            "on_header_value": self.headers.value,
+            "on_header_end": self.headers.end,
+            "on_headers_finished": self._part_begin,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+            "on_end": self._end,
+        })
+
+    async def read(self, body: AsyncIterator[bytes]) -> bool:
+        """Stores every file part of `body` and tells whether the body ended with its closing boundary."""
+        received = 0
+        async for chunk in body:
+            received += len(chunk)
+            if received > self.max_request_size:
+                raise UploadTooLarge()
+            await self.feed(chunk)
+        self._parser.finalize()
+        return self.done and not self.in_file
+
+    async def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+        pending, self._pending = self._pending, []
+        for step in pending:
+            await step()
+
+    def _part_begin(self) -> None:
+        filename = self.headers.filename()
+        self.in_file = bool(filename)
+        if self.in_file:
+            self._pending.append(partial(self.sink.open, filename, self.headers.content_type.decode("latin-1")))
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.in_file:
+            self._pending.append(partial(self.sink.write, data[start:end]))
+
+    def _part_end(self) -> None:
+        if self.in_file:
+            self._pending.append(self.sink.close)
+        self.in_file = False
+
+    def _end(self) -> None:
+        self.done = True
+
+
+async def store_uploads(content_type: str, body: AsyncIterator[bytes], owner: str) -> List[StoredFile]:
+    ctype, params = parse_options_header(content_type)
+    if ctype != b"multipart/form-data" or b"boundary" not in params:
+        raise MalformedUpload(content_type)
+
+    sink = UploadSink(Path(settings.upload_dir) / owner, settings.upload_max_file_size, settings.upload_chunk_size)
+    upload = MultipartUpload(params[b"boundary"], sink, settings.upload_max_request_size)
+    try:
+        if not await upload.read(body):
+            raise MalformedUpload(content_type)
+    except MultipartParseError as e:
+        await sink.discard()
+        raise MalformedUpload(content_type) from e
+    except BaseException:
+        await sink.discard()
+        raise
+
+    return sink.stored
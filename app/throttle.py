@@ -0,0 +1,67 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class BucketStore(ABC):
+
+    @abstractmethod
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Takes a token from the bucket at `key`; returns 0 on success, else seconds until one is available."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+
+class MemoryBucketStore(BucketStore):
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.monotonic()
+        self.evict_idle(now - capacity / rate)
+
+        tokens, stamp = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def evict_idle(self, before: float) -> None:
+        while self._buckets:
+            _, (_, stamp) = next(iter(self._buckets.items()))
+            if stamp > before:
+                return
+            self._buckets.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._buckets.clear()
+
+
+class RateLimiter:
+
+    def __init__(self, capacity: float, per_minute: float, store: Optional[BucketStore] = None) -> None:
+        self.capacity = capacity
+        self.rate     = per_minute / 60
+        self.store    = store or MemoryBucketStore()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.rate > 0
+
+    async def hit(self, key: str) -> float:
+        if not self.enabled:
+            return 0.0
+        return await self.store.take(key, self.capacity, self.rate)
@@ -0,0 +1,36 @@
+import time
+from typing import Awaitable, Callable, Tuple
+
+from jose import jwt
+
+from app import BOOTED_AT
+from app.config import settings
+from app.crud.users import user
+from app.db.utils import hasher
+from app.metrics import Gauge
+
+STARTUP = Gauge(
+    "app_startup_seconds", "Cold-start seconds: import and ready since boot, warm-up steps by duration.", ("phase",)
+)
+
+
+def since_boot() -> float:
+    return time.perf_counter() - BOOTED_AT
+
+
+async def prime_jwt() -> None:
+    jwt.decode(jwt.encode({"sub": "warm-up"}, settings.secret_key, settings.algo), settings.secret_key, [settings.algo])
+
+
+PHASES: Tuple[Tuple[str, Callable[[], Awaitable[None]]], ...] = (
+    ("warm_up_db", user.repo.warm_up),
+    ("warm_up_hasher", hasher.warm_up),
+    ("warm_up_jwt", prime_jwt),
+)
+
+
+async def warm_up() -> None:
+    for phase, step in PHASES:
+        started = time.perf_counter()
+        await step()
+        STARTUP.set(time.perf_counter() - started, phase)
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+CHILD = """
+import asyncio, json
+from app.main import app, shutdown, startup
+from app.warmup import STARTUP
+
+async def cycle():
+    await startup()
+    await shutdown()
+
+asyncio.run(cycle())
+print(json.dumps({phase: v for (phase,), v in STARTUP.values.items()}))
+"""
+
+
+def cold_start(warm_up: bool) -> Dict[str, float]:
+    env = {**os.environ, "WARM_UP": str(warm_up).lower()}
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def run(runs: int, warm_up: bool) -> Dict[str, Any]:
+    samples = [cold_start(warm_up) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "warm_up": warm_up,
+        **{f"{phase}_ms": round(statistics.median(s[phase] for s in samples) * 1000, 1) for phase in samples[0]},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Median import and startup time of fresh interpreter processes.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-warm-up", dest="warm_up", action="store_false")
+    args = parser.parse_args(argv)
+
+    sys.stdout.write(json.dumps(run(args.runs, args.warm_up), indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LOWER_IS_BETTER  = ("p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rows(base: Dict[str, Any], head: Dict[str, Any]) -> Iterator[Tuple[str, str, float, float, float]]:
+    sections = {"total": (base["total"], head["total"])}
+    for name in sorted(set(base["workloads"]) & set(head["workloads"])):
+        sections[name] = (base["workloads"][name], head["workloads"][name])
+    
+    for name, (b, h) in sections.items():
+        for metric in (*HIGHER_IS_BETTER, *LOWER_IS_BETTER):
+            change = (h[metric] - b[metric]) / b[metric] * 100 if b[metric] else 0.0
+            worse  = -change if metric in HIGHER_IS_BETTER else change
+            yield name, metric, b[metric], h[metric], worse
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Diff two benchmark reports produced by benchmarks.run.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression, percent.")
+    args = parser.parse_args(argv)
+    
+    regressions = 0
+    for name, metric, b, h, worse in rows(load(args.base), load(args.head)):
+        flag = "REGRESSION" if worse > args.threshold else ""
+        regressions += bool(flag)
+        print(f"{name:<12} {metric:<15} {b:>12.3f} {h:>12.3f} {-worse:>+8.1f}% {flag}")
+    
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from httpx import AsyncClient, Response
+from sqlalchemy import create_engine
+
+from app.config import get_conn_url, settings
+from app.crud.users import user
+from app.db.base import metadata
+from app.main import app
+from app.routers.auth import login_by_ip, login_by_name
+from app.schemas.users import UsrIn
+
+PASSWORD  = "!ValidPass2022"
+WORKLOADS = {"login": 1, "get_user": 10, "list_users": 3, "update_user": 2, "register": 1}
+REFUSE_PG = (
+    "Refusing to benchmark against Postgres database {!r}: set USER_BACKEND=memory, "
+    "or point POSTGRES_DATABASE at a database dedicated to benchmarks (named *bench*) and pass --postgres."
+)
+
+Op = Callable[[AsyncClient, "Fixtures", int], Awaitable[Response]]
+
+
+@dataclass
+class Fixtures:
+    ids:         List[str] = field(default_factory=list)
+    names:       List[str] = field(default_factory=list)
+    headers:     List[Dict[str, str]] = field(default_factory=list)
+    admin:       Dict[str, str] = field(default_factory=dict)
+    next_pages:  List[str] = field(default_factory=list)
+    created:     List[str] = field(default_factory=list)
+
+
+def new_user(admin: bool = False) -> UsrIn:
+    name = f"b{uuid4().hex[:12]}"
+    return UsrIn(username=name, email=f"{name}@bench.io", admin=admin, password=PASSWORD, password2=PASSWORD)
+
+
+async def login(c: AsyncClient, fx: Fixtures, n: int) -> Response:
+    creds = {"username": fx.names[n % len(fx.names)], "password": PASSWORD, "scope": "users:rw"}
+    return await c.post("/token", data=creds)
+
+
+async def get_user(c: AsyncClient, fx: Fixtures, n: int) -> Response:
+    i = n % len(fx.ids)
+    return await c.get(f"/users/{fx.ids[i]}", headers=fx.headers[i])
+
+
+async def list_users(c: AsyncClient, fx: Fixtures, _n: int) -> Response:
+    url = fx.next_pages.pop() if fx.next_pages else "/users/?limit=20"
+    r = await c.get(url, headers=fx.admin)
+    if "link" in r.headers:
+        fx.next_pages.append(r.headers["link"].split(">")[0].lstrip("<"))
+    return r
+
+
+async def update_user(c: AsyncClient, fx: Fixtures, n: int) -> Response:
+    i = n % len(fx.ids)
+    return await c.put(f"/users/{fx.ids[i]}", json={"email": f"u{n}.{uuid4().hex[:8]}@bench.io"}, headers=fx.headers[i])
+
+
+async def register(c: AsyncClient, fx: Fixtures, _n: int) -> Response:
+    u = new_user()
+    r = await c.post("/users/", json={**u.dict(), "email": str(u.email)})
+    if r.status_code == 201:
+        fx.created.append(r.json()["id"])
+    return r
+
+
+OPS: Dict[str, Op] = {
+    "login": login, "get_user": get_user, "list_users": list_users, "update_user": update_user, "register": register
+}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        **{f"p{p}_ms": round(percentile(ordered, p) * 1000, 3) for p in (50, 95, 99)},
+    }
+
+
+async def prepare(c: AsyncClient, fx: Fixtures, users_count: int) -> None:
+    seeded = [new_user(admin=True)] + [new_user() for _ in range(users_count)]
+    created = await user.create_many(seeded)
+    fx.created.extend(str(attrs["id"]) for attrs in created if attrs)
+    for u, attrs in zip(seeded, created):
+        assert attrs, f"could not seed {u.username}"
+        r = await c.post("/token", data={"username": u.username, "password": PASSWORD, "scope": "users:rw"})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        if u.admin:
+            fx.admin = headers
+            continue
+        fx.ids.append(str(attrs["id"]))
+        fx.names.append(u.username)
+        fx.headers.append(headers)
+
+
+async def drive(c: AsyncClient, fx: Fixtures, plan: List[str], concurrency: int) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {name: [] for name in set(plan)}
+    errors:    Dict[str, int] = {name: 0 for name in set(plan)}
+    cursor = iter(enumerate(plan))
+    
+    async def worker() -> None:
+        for n, name in cursor:
+            started = time.perf_counter()
+            r = await OPS[name](c, fx, n)
+            latencies[name].append(time.perf_counter() - started)
+            if r.status_code >= 400:
+                errors[name] += 1
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "total": summarize([x for v in latencies.values() for x in v], sum(errors.values()), elapsed),
+        "workloads": {name: summarize(latencies[name], errors[name], elapsed) for name in sorted(latencies)},
+    }
+
+
+def build_plan(mix: Dict[str, int], total: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return rng.choices(list(mix), weights=list(mix.values()), k=total)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = dict(WORKLOADS)
+    if spec:
+        mix = {k: int(v) for k, v in (part.split("=") for part in spec.split(","))}
+    unknown = set(mix) - set(OPS)
+    if unknown:
+        raise SystemExit(f"unknown workloads: {', '.join(sorted(unknown))}")
+    return mix
+
+
+async def clean_up(fx: Fixtures) -> None:
+    for _id in fx.created:
+        await user.delete(UUID(_id))
+
+
+def check_target(args: argparse.Namespace) -> None:
+    if settings.user_backend != "postgres":
+        return
+    if not args.postgres or "bench" not in settings.postgres_database:
+        raise SystemExit(REFUSE_PG.format(settings.postgres_database))
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    check_target(args)
+    if settings.user_backend == "postgres":
+        metadata.create_all(create_engine(get_conn_url(sync=True)))
+    mix = parse_mix(args.mix)
+    login_by_ip.capacity = login_by_name.capacity = 0
+    
+    fx = Fixtures()
+    await app.router.startup()
+    try:
+        async with AsyncClient(app=app, base_url="http://bench") as c:
+            await prepare(c, fx, args.users)
+            await drive(c, fx, build_plan(mix, args.warmup, args.seed + 1), args.concurrency)
+            results = await drive(c, fx, build_plan(mix, args.requests, args.seed), args.concurrency)
+    finally:
+        await clean_up(fx)
+        await app.router.shutdown()
+    
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "seed": args.seed,
+            "mix": mix,
+        },
+        **results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Drive the ASGI app in-process with a mixed workload.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", default="", help="e.g. login=1,get_user=10")
+    parser.add_argument("--out", default="-", help="Output JSON path, '-' for stdout.")
+    parser.add_argument(
+        "--postgres", 
+        action="store_true", 
+        help="Allow USER_BACKEND=postgres; POSTGRES_DATABASE must be a *bench* database.",
+    )
+    args = parser.parse_args(argv)
+    
+    with contextlib.redirect_stdout(sys.stderr):  # the app logs to stdout; keep it clear for the report
+        report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.out == "-":
+        sys.stdout.write(report + "\n")
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
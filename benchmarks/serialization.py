@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import JSONResponse
+
+from app.crud.repository import Row
+from app.responses import FastJSONResponse
+from app.routers.users import out_row
+from app.schemas.users import UsrOut
+
+FIELD = create_response_field("Response_list_users", List[Optional[UsrOut]])
+
+
+def fake_rows(n: int) -> List[Row]:
+    now = datetime.now(timezone.utc)
+    return [
+        Row(
+            id=uuid4(), created_at=now, updated_at=now, username=f"bench.user{i}", email=f"bench{i}@bench.io",
+            password="$2b$12$" + "x" * 53, active=True, admin=False,
+        )
+        for i in range(n)
+    ]
+
+
+async def validated(rows: List[Row]) -> bytes:
+    return JSONResponse(await serialize_response(field=FIELD, response_content=rows)).body
+
+
+async def direct(rows: List[Row]) -> bytes:
+    return FastJSONResponse([out_row(r) for r in rows]).body
+
+
+async def per_row_us(fn: Callable[[List[Row]], Any], rows: List[Row], rounds: int) -> float:
+    await fn(rows)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await fn(rows)
+    return (time.perf_counter() - started) / rounds / len(rows) * 1e6
+
+
+async def run(page: int, rounds: int) -> Dict[str, Any]:
+    rows = fake_rows(page)
+    assert json.loads(await validated(rows)) == json.loads(await direct(rows))
+
+    before, after = await per_row_us(validated, rows, rounds), await per_row_us(direct, rows, rounds)
+    return {
+        "page_size": page,
+        "validated_us_per_row": round(before, 2),
+        "direct_us_per_row": round(after, 2),
+        "speedup": round(before / after, 1) if after else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serialization cost per row: response_model validation vs direct rows."
+    )
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    sys.stdout.write(json.dumps(asyncio.run(run(args.page, args.rounds)), indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from databases.backends.postgres import PostgresBackend, PostgresConnection
+from sqlalchemy import tuple_
+
+from app.crud.postgres import GET, GET_BY_NAME, PAGE_AFTER, PAGE_FIRST, PostgresUserRepository
+from app.db.session import dsn
+from app.models.users import users
+
+_ID   = uuid4()
+_NOW  = datetime.utcnow()
+_VALS = {"email": "bench@bench.io", "updated_at": _NOW}
+
+backend = PostgresBackend(dsn())
+conn    = PostgresConnection(backend, backend._dialect)  # pylint: disable=protected-access
+compile_adhoc = conn._compile  # pylint: disable=protected-access
+repo = PostgresUserRepository()
+
+ADHOC: Dict[str, Callable[[], Any]] = {
+    "get":         lambda: compile_adhoc(users.select().where(users.c.id == _ID)),
+    "get_by_name": lambda: compile_adhoc(users.select().where(users.c.username == "bench")),
+    "page_first":  lambda: compile_adhoc(users.select().order_by(users.c.created_at, users.c.id).limit(20)),
+    "page_after":  lambda: compile_adhoc(
+        users.select().where(tuple_(users.c.created_at, users.c.id) > tuple_(_NOW, _ID))
+        .order_by(users.c.created_at, users.c.id).limit(20)
+    ),
+    "update":      lambda: compile_adhoc(users.update().where(users.c.id == _ID).values(**_VALS)),
+}
+
+PREPARED: Dict[str, Callable[[], Any]] = {
+    "get":         lambda: GET.args({"_id": _ID}),
+    "get_by_name": lambda: GET_BY_NAME.args({"username": "bench"}),
+    "page_first":  lambda: PAGE_FIRST.args({"limit": 20}),
+    "page_after":  lambda: PAGE_AFTER.args({"limit": 20, "after_created_at": _NOW, "after_id": _ID}),
+    "update":      lambda: repo._update_stmt(  # pylint: disable=protected-access
+        tuple(sorted(_VALS))
+    ).args({"_id": _ID, **_VALS}),
+}
+
+
+def per_call_us(fn: Callable[[], Any], rounds: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def run(rounds: int) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for name, compile_one in ADHOC.items():
+        adhoc, prepared = per_call_us(compile_one, rounds), per_call_us(PREPARED[name], rounds)
+        report[name] = {
+            "adhoc_us": round(adhoc, 2),
+            "prepared_us": round(prepared, 2),
+            "saved_us": round(adhoc - prepared, 2),
+            "speedup": round(adhoc / prepared, 1) if prepared else 0.0,
+        }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Client-side CPU per query: ad hoc compilation through databases vs precompiled statements."
+    )
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args(argv)
+    sys.stdout.write(json.dumps(run(args.rounds), indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
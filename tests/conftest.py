@@ -1,52 +1,50 @@
+import os
 from datetime import datetime
-from typing import Any, Callable, Dict, Generator, Tuple
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Tuple
 
 import pytest
 from fastapi import Response
 from httpx import AsyncClient
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy_utils import create_database, database_exists
 
-from app.config import dev_conn_string
-from app.crud.users import user
-from app.db.meta import BaseModel
-from app.deps import get_db
-from app.main import app
-from app.models.users import User
-from app.schemas.users import UsrIn
+os.environ.setdefault("USER_BACKEND", "memory")
+os.environ.setdefault("HASH_POOL_KIND", "thread")
+os.environ.setdefault("LOG_CONFIG", "")
+if os.environ["USER_BACKEND"] == "memory":
+    for var in ("SECRET_KEY", "ADMIN_KEY", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_PORT", 
+                "POSTGRES_DATABASE"):
+        os.environ.setdefault(var, f"test-{var.lower()}")
 
+from app.config import get_conn_url, settings  # pylint: disable=wrong-import-position
+from app.crud.repository import Row  # pylint: disable=wrong-import-position
+from app.crud.users import user  # pylint: disable=wrong-import-position
+from app.db.meta import metadata  # pylint: disable=wrong-import-position
+from app.db.utils import pass_manager  # pylint: disable=wrong-import-position
+from app.main import app  # pylint: disable=wrong-import-position
+from app.routers.auth import login_by_ip, login_by_name  # pylint: disable=wrong-import-position
+from app.schemas.users import UsrIn  # pylint: disable=wrong-import-position
 
-def prepare_dev_db(conn: str) -> sessionmaker:
+pass_manager.update(bcrypt__default_rounds=4)
+
+
+def prepare_dev_db(conn: str) -> None:
     if not database_exists(conn):
         create_database(conn)
-        
-    dev_engine = create_engine(conn, pool_pre_ping=True)
-    BaseModel.metadata.create_all(bind=dev_engine)
+    metadata.create_all(bind=create_engine(conn, pool_pre_ping=True))
 
-    return sessionmaker(autoflush=False, bind=dev_engine)
 
+if settings.user_backend == "postgres":
+    prepare_dev_db(get_conn_url(sync=True))
 
-DevSession = prepare_dev_db(dev_conn_string)
+FakeUser = Callable[..., Awaitable[Tuple[Row, str]]]
 
 
-def get_dev_db() -> Generator[Session, None, None]:
-    try:
-        s = DevSession()
-        yield s
-    finally:
-        s.close()
-        
-app.dependency_overrides[get_db] = get_dev_db
+@pytest.fixture()
+def anyio_backend() -> str:
+    return "asyncio"
 
 
-@pytest.fixture()
-def db():
-    s = DevSession()
-    yield s
-    s.close()
-    
-    
 @pytest.fixture()
 def reg_data():
     return {
@@ -58,16 +56,18 @@ def reg_data():
 
 
 @pytest.fixture(autouse=True)
-def clean_up() -> Generator[None, None, None]:
+async def clean_up() -> AsyncGenerator[None, None]:
+    await user.repo.connect()
     yield
-    with DevSession() as s:
-        user.purge(s)
+    await user.purge()
+    await login_by_ip.store.clear()
+    await login_by_name.store.clear()
+    await user.repo.disconnect()
 
 
-    
 @pytest.fixture()
-def fake_user() -> Generator[Callable[[bool], Tuple[User, str]], None, None]:
-    yield create_fake_user
+def fake_user() -> FakeUser:
+    return create_fake_user
 
 
 @pytest.fixture()
@@ -91,7 +91,7 @@ def err(resp: Response) -> Any:
     return resp.json()["detail"]  # type: ignore
 
 
-def create_fake_user(admin: bool = False) -> Tuple[User ,str]:
+async def create_fake_user(admin: bool = False) -> Tuple[Row, str]:
     timestamp = datetime.utcnow().timestamp()
     pwd = "!ValidPass2022"
     reg_details = UsrIn(
@@ -102,7 +102,8 @@ def create_fake_user(admin: bool = False) -> Tuple[User ,str]:
         password2=pwd,
     )
     
-    with DevSession() as s:
-        u = user.create(s, reg_details)
-        return u, pwd  
-    
\ No newline at end of file
+    auto_assigned = await user.create(reg_details)
+    assert auto_assigned
+    u = await user.get(auto_assigned["id"])
+    assert u
+    return u, pwd
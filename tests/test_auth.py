@@ -1,12 +1,19 @@
-from app.crud.users import user
-from app.routers.auth import INVALID_CREDS, USER_INACTIVE
-from tests.conftest import err
+import pytest
+
+from app.config import settings
+from app.crud.users import recent_writes, user
+from app.db import utils
+from app.deps import decode_token, tokens
+from app.routers.auth import INVALID_CREDS, TOO_MANY_ATTEMPTS, USER_INACTIVE, login_by_name
+from tests.conftest import err, jwt_auth_headers, login_data
 
 LOGIN_URL = "/token"
 
+pytestmark = pytest.mark.anyio
+
 
 async def test_auth_fails_if_no_or_wrong_form(client, fake_user):
-    usr, usr_pass = fake_user()
+    usr, usr_pass = await fake_user()
     
     async with client:
         no_form_data = await client.post(LOGIN_URL, data={})
@@ -26,10 +33,10 @@ async def test_auth_fails_when_no_such_user(client):
         assert err(r) == INVALID_CREDS
 
 
-async def test_auth_fails_when_user_not_active(client, fake_user, db):
-    usr, usr_pass = fake_user()
+async def test_auth_fails_when_user_not_active(client, fake_user):
+    usr, usr_pass = await fake_user()
     
-    user.deactivate(db, usr)
+    await user.deactivate(usr.id)
     
     async with client:
         r = await client.post(LOGIN_URL, data={"username":usr.username, "password": usr_pass})
@@ -38,7 +45,7 @@ async def test_auth_fails_when_user_not_active(client, fake_user, db):
 
 
 async def test_jwt_returned_when_creds_ok(client, fake_user):
-    usr, usr_pass = fake_user()
+    usr, usr_pass = await fake_user()
     
     async with client:
         r = await client.post(
@@ -46,3 +53,103 @@ async def test_jwt_returned_when_creds_ok(client, fake_user):
         )
         assert r.status_code == 201
         assert isinstance(r.json()["access_token"], str)
+
+
+
+async def test_stateless_tokens_skip_principal_lookup_until_revoked(client, fake_user, monkeypatch):
+    monkeypatch.setattr(settings, "stateless_auth", True)
+    usr, usr_pass = await fake_user()
+    
+    lookups = []
+    get_cached = user.get_cached
+    async def counting_get_cached(_id):
+        lookups.append(_id)
+        return await get_cached(_id)
+    monkeypatch.setattr(user, "get_cached", counting_get_cached)
+    
+    async with client:
+        login = await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass))
+        headers = jwt_auth_headers(login)
+        
+        r = await client.get(f"/users/{usr.id}", headers=headers)
+        assert r.status_code == 200
+        assert not lookups
+        
+        await user.deactivate(usr.id)
+        r = await client.get(f"/users/{usr.id}", headers=headers)
+        assert r.status_code == 400
+        assert err(r) == USER_INACTIVE
+        assert lookups == [usr.id]
+
+
+async def test_decoded_tokens_are_cached_until_expiry(client, fake_user):
+    usr, usr_pass = await fake_user()
+    
+    async with client:
+        login = await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass))
+    tkn = login.json()["access_token"]
+    
+    hits = tokens.hits
+    assert decode_token(tkn).id == decode_token(tkn).id == usr.id
+    assert tokens.hits == hits + 1
+    
+    assert decode_token(tkn[::-1]) is None
+    assert decode_token(tkn[::-1]) is None
+    assert tokens.hits == hits + 2
+
+
+async def test_login_rehashes_password_with_outdated_cost(client, fake_user, monkeypatch):
+    usr, usr_pass = await fake_user()
+    recent_writes.clear()
+    monkeypatch.setattr(utils, "pass_manager", utils.pass_manager.copy(bcrypt__default_rounds=5, bcrypt__min_rounds=5))
+    
+    async with client:
+        login = await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass))
+        assert login.status_code == 201
+        rehashed = (await user.get(usr.id)).password
+        assert rehashed != usr.password and rehashed.startswith("$2b$05$")
+        
+        again = await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass))
+        assert again.status_code == 201
+        assert (await user.get(usr.id)).password == rehashed
+        assert recent_writes.get(usr.id)
+
+
+async def test_inactive_login_keeps_outdated_hash(client, fake_user, monkeypatch):
+    usr, usr_pass = await fake_user()
+    await user.deactivate(usr.id)
+    monkeypatch.setattr(utils, "pass_manager", utils.pass_manager.copy(bcrypt__default_rounds=5, bcrypt__min_rounds=5))
+    
+    async with client:
+        login = await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass))
+        assert login.status_code == 400 and err(login) == USER_INACTIVE
+        assert (await user.get(usr.id)).password == usr.password
+
+
+def test_calibration_stays_within_bcrypt_limits():
+    assert utils.calibrate(0.001) == utils.MIN_ROUNDS
+
+
+async def test_login_attempts_throttled_per_username_before_lookup(client, fake_user, monkeypatch):
+    usr, usr_pass = await fake_user()
+    monkeypatch.setattr(login_by_name, "capacity", 2)
+    
+    lookups = []
+    get = user.get
+    async def counting_get(*args, **kwargs):
+        lookups.append(kwargs)
+        return await get(*args, **kwargs)
+    monkeypatch.setattr(user, "get", counting_get)
+    
+    async with client:
+        for _ in range(2):
+            assert (await client.post(LOGIN_URL, data=login_data(usr.username, "wrong"))).status_code == 401
+        
+        throttled = await client.post(LOGIN_URL, data=login_data(usr.username.upper(), usr_pass))
+        assert throttled.status_code == 429
+        assert err(throttled) == TOO_MANY_ATTEMPTS
+        assert int(throttled.headers["retry-after"]) >= 1
+        assert len(lookups) == 2
+        
+        other = await client.post(LOGIN_URL, data=login_data("someone.else", usr_pass))
+        assert other.status_code == 401
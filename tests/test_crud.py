@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+from app.crud.users import UserCRUD, UserFilter, UserLoader, recent_writes, user
+from app.schemas.users import UserInfoUpd, UsrIn
+
+pytestmark = pytest.mark.anyio
+
+PWD = "!ValidPass2022"
+
+
+def reg(name: str, email: str = "") -> UsrIn:
+    return UsrIn(username=name, email=email or f"{name}@gmail.com", password=PWD, password2=PWD)
+
+
+async def test_username_and_email_are_unique():
+    assert await user.create(reg("first.user"))
+    assert await user.create(reg("first.user", "other@gmail.com")) is None
+    assert await user.create(reg("second.user", "first.user@gmail.com")) is None
+    assert await user.create(reg("second.user"))
+
+
+async def test_username_and_email_are_case_insensitive():
+    created = await user.create(reg("Mixed.Case", "Mixed@Gmail.com"))
+    assert created
+    assert await user.create(reg("mixed.case", "other@gmail.com")) is None
+    assert await user.create(reg("other.user", "mixed@gmail.com")) is None
+    
+    found = await user.get(username="MIXED.case")
+    assert found and found["id"] == created["id"] and found["username"] == "Mixed.Case"
+
+
+async def test_update_conflicts_and_keeps_lookups_consistent():
+    first  = await user.create(reg("first.user"))
+    second = await user.create(reg("second.user"))
+    assert first and second
+    
+    assert await user.update(uuid4(), UserInfoUpd(username="ghost.user")) is None
+    assert await user.update(second["id"], UserInfoUpd(username="first.user")) is False
+    assert await user.update(second["id"], UserInfoUpd(username="renamed.user"))
+    
+    assert (await user.get(username="renamed.user"))["id"] == second["id"]
+    assert await user.get(username="second.user") is None
+    assert await user.create(reg("second.user", "new@gmail.com"))
+
+
+async def test_create_many_skips_conflicting_rows():
+    assert await user.create(reg("taken.name"))
+    
+    rows = [reg("fresh.name1"), reg("taken.name", "x@gmail.com"), reg("fresh.name1", "y@gmail.com")]
+    created = await user.create_many(rows)
+    assert created[0] and created[1] is None and created[2] is None
+
+
+async def test_pages_follow_creation_order():
+    created = await user.create_many([reg(f"paged.user{i}") for i in range(5)])
+    created_ids = sorted(c["id"] for c in created if c)
+    
+    first = await user.get_many(3)
+    rest  = await user.get_many(3, (first[-1]["created_at"], first[-1]["id"]))
+    assert [u["id"] for u in [*first, *rest]] == created_ids
+
+
+async def test_pages_filter_by_text_flags_and_ranges():
+    rows = (reg("Ann.Lee"), reg("anna.b", "anna_b@corp.io"), reg("annaxb"), reg("bob.ann"))
+    created = [await user.create(r) for r in rows]
+    ann, anna_b, annaxb, bob = (c["id"] for c in created)
+    await user.deactivate(annaxb)
+
+    async def ids(**where):
+        return [u["id"] for u in await user.get_many(10, where=UserFilter(**where))]
+
+    assert await ids(username_prefix="ANN") == [ann, anna_b, annaxb]
+    assert await ids(email_prefix="anna_") == [anna_b]
+    assert await ids(username_contains="ann", active=True) == [ann, anna_b, bob]
+    assert await ids(username_contains="%") == []
+    assert await ids(email_contains="@CORP.") == [anna_b]
+    assert await ids(active=False) == [annaxb]
+    assert await ids(admin=True) == []
+
+    now = datetime.now(timezone.utc)
+    assert await ids(created_until=now, updated_since=now - timedelta(minutes=1)) == [ann, anna_b, annaxb, bob]
+    assert await ids(created_since=now) == []
+
+    contains_ann = UserFilter(username_contains="ann")
+    first = await user.get_many(2, where=contains_ann)
+    rest  = await user.get_many(2, (first[-1]["created_at"], first[-1]["id"]), where=contains_ann)
+    assert [u["id"] for u in [*first, *rest]] == [ann, anna_b, annaxb, bob]
+
+
+async def test_deleted_user_is_gone_everywhere():
+    attrs = await user.create(reg("short.lived"))
+    assert attrs
+    
+    assert await user.delete(attrs["id"])
+    assert not await user.delete(attrs["id"])
+    assert await user.get(attrs["id"]) is None
+    assert await user.get(username="short.lived") is None
+    assert [u async for u in user.iterate()] == []
+
+
+async def test_reads_are_fresh_only_after_recent_writes(monkeypatch):
+    reads = []
+    get = user.repo.get
+    async def spy_get(_id, fresh=False):
+        reads.append(fresh)
+        return await get(_id, fresh)
+    monkeypatch.setattr(user.repo, "get", spy_get)
+    
+    monkeypatch.setattr(recent_writes, "ttl", 0.0)
+    stale = await user.create(reg("stale.user"))
+    monkeypatch.setattr(recent_writes, "ttl", 60.0)
+    fresh = await user.create(reg("fresh.user"))
+    assert stale and fresh
+    
+    await user.get(stale["id"])
+    await user.get(fresh["id"])
+    user.pin(fresh["id"])
+    await user.get(stale["id"])
+    user.pin(stale["id"])
+    await user.get(stale["id"])
+    assert reads == [False, True, True, False]
+
+
+async def test_loader_coalesces_concurrent_gets(monkeypatch):
+    first  = await user.create(reg("first.user"))
+    second = await user.create(reg("second.user"))
+    assert first and second
+    recent_writes.clear()
+    
+    batches = []
+    get_batch = user.repo.get_batch
+    async def spy_get_batch(ids, fresh=False):
+        batches.append(sorted(ids))
+        return await get_batch(ids, fresh)
+    monkeypatch.setattr(user.repo, "get_batch", spy_get_batch)
+    
+    crud = UserCRUD(user.repo, UserLoader(user.repo, window=0.01))
+    ids = [first["id"], second["id"], first["id"], uuid4()]
+    found = await asyncio.gather(*(crud.get(_id) for _id in ids))
+    
+    assert [u and u["id"] for u in found] == ids[:3] + [None]
+    assert batches == [sorted(set(ids))]
+
+
+async def test_loader_fails_the_rest_of_a_batch_when_one_waiter_is_gone(monkeypatch):
+    async def broken_get_batch(ids, fresh=False):
+        raise RuntimeError("replica down")
+    monkeypatch.setattr(user.repo, "get_batch", broken_get_batch)
+    
+    loader = UserLoader(user.repo, window=0.01)
+    gone, waiting = uuid4(), uuid4()
+    first  = asyncio.ensure_future(loader.load(gone))
+    second = asyncio.ensure_future(loader.load(waiting))
+    await asyncio.sleep(0)
+    loader._inflight[gone].cancel()  # pylint: disable=protected-access
+    
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(second, 1)
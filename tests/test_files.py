@@ -0,0 +1,98 @@
+import hashlib
+from typing import AsyncIterator, Dict
+
+import pytest
+
+from app.config import settings
+from app.routers.files import NOT_MULTIPART, UPLOAD_TOO_LARGE
+from tests.conftest import err, jwt_auth_headers, login_data
+
+FILES_URL = "/files/"
+BOUNDARY  = "upload-boundary"
+MULTIPART = f"multipart/form-data; boundary={BOUNDARY}"
+
+pytestmark = pytest.mark.anyio
+
+
+def multipart_body(files: Dict[str, bytes], boundary: str = BOUNDARY) -> bytes:
+    body = b""
+    for name, data in files.items():
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="{name}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+async def chunked(body: bytes, size: int = 16) -> AsyncIterator[bytes]:
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+@pytest.fixture()
+async def auth(client, fake_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    u, pwd = await fake_user()
+    async with client:
+        r = await client.post("/token", data=login_data(u.username, pwd))
+        yield jwt_auth_headers(r)
+
+
+def stored(tmp_path):
+    return [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+async def test_upload_stores_files_with_sizes_and_digests(client, auth, tmp_path):
+    files = {"a.txt": b"hello", "../b.bin": bytes(range(256)) * 40}
+    r = await client.post(FILES_URL, content=multipart_body(files), headers={**auth, "Content-Type": MULTIPART})
+    assert r.status_code == 201
+
+    out = r.json()
+    assert [f["filename"] for f in out] == ["a.txt", "b.bin"]
+    for f, data in zip(out, files.values()):
+        assert f["size"] == len(data)
+        assert f["sha256"] == hashlib.sha256(data).hexdigest()
+    assert sorted(p.read_bytes() for p in stored(tmp_path)) == sorted(files.values())
+
+
+async def test_oversized_file_is_rejected_and_discarded(client, auth, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_file_size", 10)
+    body = multipart_body({"small.txt": b"ok", "big.txt": b"x" * 11})
+    r = await client.post(FILES_URL, content=body, headers={**auth, "Content-Type": MULTIPART})
+    assert r.status_code == 413
+    assert err(r) == UPLOAD_TOO_LARGE
+    assert not stored(tmp_path)
+
+
+@pytest.mark.parametrize("declared", [True, False])
+async def test_oversized_request_is_rejected(client, auth, tmp_path, monkeypatch, declared):
+    monkeypatch.setattr(settings, "upload_max_request_size", 64)
+    body = multipart_body({"a.txt": b"x" * 100})
+    r = await client.post(
+        FILES_URL, content=body if declared else chunked(body), headers={**auth, "Content-Type": MULTIPART}
+    )
+    assert r.status_code == 413
+    assert err(r) == UPLOAD_TOO_LARGE
+    assert not stored(tmp_path)
+
+
+@pytest.mark.parametrize("content_type, body", [
+    ("multipart/form-data", multipart_body({"a.txt": b"data"})),
+    ("application/octet-stream", b"data"),
+    (MULTIPART, multipart_body({"a.txt": b"data"}, boundary="other-boundary")),
+])
+async def test_malformed_uploads_are_rejected(client, auth, tmp_path, content_type, body):
+    r = await client.post(FILES_URL, content=body, headers={**auth, "Content-Type": content_type})
+    assert r.status_code == 400
+    assert err(r) == NOT_MULTIPART
+    assert not stored(tmp_path)
+
+
+@pytest.mark.parametrize("cut", [len(f"--{BOUNDARY}--\r\n"), len(f"\r\n--{BOUNDARY}--\r\n") + 3])
+async def test_truncated_body_is_rejected_and_discarded(client, auth, tmp_path, cut):
+    body = multipart_body({"a.txt": b"complete", "b.txt": b"truncated"})[:-cut]
+    r = await client.post(FILES_URL, content=chunked(body), headers={**auth, "Content-Type": MULTIPART})
+    assert r.status_code == 400
+    assert err(r) == NOT_MULTIPART
+    assert not stored(tmp_path)
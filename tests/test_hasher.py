@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.db import utils
+from app.db.utils import HasherBusy, PassHasher
+from app.main import HASHER_BUSY
+from tests.conftest import err, login_data
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture()
+def gate(monkeypatch):
+    opened = threading.Event()
+    
+    def blocked_hash(secret):
+        opened.wait(5)
+        return f"hashed:{secret}"
+    
+    monkeypatch.setattr(utils, "_hash", blocked_hash)
+    yield opened
+    opened.set()
+
+
+async def test_hashes_and_verifies_off_the_loop():
+    hasher = PassHasher("thread", workers=2, queue_size=4, rounds=utils.MIN_ROUNDS)
+    try:
+        hashed = await hasher.hash("!ValidPass2022")
+        assert await hasher.verify("!ValidPass2022", hashed)
+        assert not await hasher.verify("!WrongPass2022", hashed)
+        assert len(await hasher.hash_many(["a", "b", "c", "d", "e"])) == 5
+    finally:
+        hasher.shutdown()
+
+
+async def test_calls_beyond_queue_size_are_rejected(gate):
+    hasher = PassHasher("thread", workers=1, queue_size=2)
+    try:
+        queued = [asyncio.create_task(hasher.hash(s)) for s in ("first", "second")]
+        await asyncio.sleep(0)
+        assert hasher.depth == 2
+        
+        with pytest.raises(HasherBusy):
+            await hasher.hash("third")
+        
+        gate.set()
+        assert await asyncio.gather(*queued) == ["hashed:first", "hashed:second"]
+        assert hasher.depth == 0
+    finally:
+        hasher.shutdown()
+
+
+async def test_bulk_hashing_waits_for_a_free_slot(gate):
+    hasher = PassHasher("thread", workers=1, queue_size=1)
+    try:
+        login = asyncio.create_task(hasher.hash("login"))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(hasher.hash_many(["first", "second"]))
+        await asyncio.sleep(0.01)
+        assert not bulk.done() and hasher.depth == 1
+        
+        gate.set()
+        assert await login == "hashed:login"
+        assert await bulk == ["hashed:first", "hashed:second"]
+        assert hasher.depth == 0
+    finally:
+        hasher.shutdown()
+
+
+async def test_shutdown_does_not_wait_for_running_hashes(gate):
+    hasher = PassHasher("thread", workers=1, queue_size=4)
+    running = asyncio.create_task(hasher.hash("slow"))
+    await asyncio.sleep(0.01)
+    
+    started = time.perf_counter()
+    hasher.shutdown()
+    assert time.perf_counter() - started < 1
+    
+    gate.set()
+    assert await running == "hashed:slow"
+
+
+async def test_login_503_when_hasher_is_saturated(client, fake_user, monkeypatch):
+    usr, usr_pass = await fake_user()
+    monkeypatch.setattr(utils.hasher, "queue_size", 0)
+    
+    async with client:
+        resp = await client.post("/token", data=login_data(usr.username, usr_pass))
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+        assert err(resp) == HASHER_BUSY
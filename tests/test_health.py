@@ -0,0 +1,26 @@
+import pytest
+
+from app import metrics
+from app.crud.users import user
+from app.main import app, shutdown, startup
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ready_only_after_warm_up(client, monkeypatch):
+    monkeypatch.setattr(app.state, "ready", False, raising=False)
+
+    async with client:
+        assert (await client.get("/health/live")).status_code == 200
+        assert (await client.get("/health/ready")).status_code == 503
+
+        await startup()
+        try:
+            assert (await client.get("/health/ready")).status_code == 200
+            rendered = metrics.render()
+            for phase in ("import", "warm_up_db", "warm_up_hasher", "warm_up_jwt", "ready"):
+                assert f'app_startup_seconds{{phase="{phase}"}}' in rendered
+        finally:
+            await shutdown()
+            await user.repo.connect()
+        assert (await client.get("/health/ready")).status_code == 503
@@ -0,0 +1,121 @@
+import json
+import logging
+import queue
+
+import pytest
+
+from app.logs import LOG_DROPPED, LOG_SAMPLED_OUT, DroppingQueueHandler, JSONFormatter, QueuedLogging, Sampler
+
+LOG_INI = """
+[loggers]
+keys=root
+
+[handlers]
+keys=logfile
+
+[formatters]
+keys=plain
+
+[logger_root]
+level=ERROR
+handlers=logfile
+
+[formatter_plain]
+format=%(levelname)s %(message)s
+
+[handler_logfile]
+class=FileHandler
+level=ERROR
+args=({path!r}, 'a')
+formatter=plain
+"""
+
+
+@pytest.fixture(autouse=True)
+def clean_up():
+    yield  # logging touches no storage
+
+
+def record(msg: str = "boom", level: int = logging.ERROR) -> logging.LogRecord:
+    return logging.LogRecord("app.test", level, __file__, 1, msg, None, None)
+
+
+def test_sampler_keeps_one_in_n_per_status():
+    sampler = Sampler({401: 3})
+    before = LOG_SAMPLED_OUT.values.get(("401",), 0)
+    
+    assert [sampler.keep(401) for _ in range(6)] == [True, False, False, True, False, False]
+    assert all(sampler.keep(500) for _ in range(3))
+    assert LOG_SAMPLED_OUT.values[("401",)] - before == 4
+
+
+def test_full_queue_drops_and_counts():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    before = LOG_DROPPED.values.get(("ERROR",), 0)
+    
+    for _ in range(3):
+        handler.handle(record())
+    assert handler.queue.qsize() == 1
+    assert LOG_DROPPED.values[("ERROR",)] - before == 2
+
+
+def test_json_formatter_emits_one_object_per_record():
+    entry = json.loads(JSONFormatter().format(record("user %s", logging.WARNING)))
+    assert entry["message"] == "user %s" and entry["levelname"] == "WARNING" and entry["name"] == "app.test"
+
+
+@pytest.mark.parametrize("json_format", [False, True])
+def test_records_reach_file_through_background_listener(tmp_path, json_format):
+    path = tmp_path / "app.log"
+    ini = tmp_path / "log.ini"
+    ini.write_text(LOG_INI.format(path=str(path)))
+    
+    pipeline = QueuedLogging(str(ini), 100, json_format)
+    pipeline.start()
+    try:
+        assert isinstance(logging.getLogger().handlers[-1], DroppingQueueHandler)
+        logging.getLogger("app.test").error("queued %d", 1)
+    finally:
+        pipeline.stop()
+    
+    line = path.read_text().strip()
+    assert json.loads(line)["message"] == "queued 1" if json_format else line == "ERROR queued 1"
+
+
+@pytest.mark.parametrize("json_format", [False, True])
+def test_tracebacks_survive_the_queue(tmp_path, json_format):
+    path = tmp_path / "app.log"
+    ini = tmp_path / "log.ini"
+    ini.write_text(LOG_INI.format(path=str(path)))
+    
+    pipeline = QueuedLogging(str(ini), 100, json_format)
+    pipeline.start()
+    try:
+        try:
+            raise ValueError("bad input")
+        except ValueError:
+            logging.getLogger("app.test").exception("failed %s", "request")
+    finally:
+        pipeline.stop()
+    
+    text = path.read_text()
+    if json_format:
+        entry = json.loads(text)
+        assert entry["message"] == "failed request" and "ValueError: bad input" in entry["exc_info"]
+    else:
+        assert text.startswith("ERROR failed request\nTraceback") and "ValueError: bad input" in text
+
+
+def test_shipped_config_keeps_app_info_and_third_party_errors(capsys):
+    root_level = logging.getLogger().level
+    pipeline = QueuedLogging("log.ini", 100)
+    pipeline.start()
+    try:
+        logging.getLogger("app.main").info("ready")
+        logging.getLogger("uvicorn.error").info("noise")
+    finally:
+        pipeline.stop()
+        logging.getLogger().setLevel(root_level)
+    
+    out = capsys.readouterr().out
+    assert "INFO [" in out and "ready" in out and "noise" not in out
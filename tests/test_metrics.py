@@ -0,0 +1,70 @@
+import pytest
+
+from app import metrics
+from app.db.utils import hasher
+from app.metrics import Counter, Gauge, Histogram, Metric
+from app.routers.metrics import PROMETHEUS_TEXT
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture()
+def scratch():
+    before = list(metrics.registry)
+    yield
+    metrics.registry[:] = before
+
+
+async def test_counters_and_gauges_render_with_their_type(scratch):
+    c = Counter("test_events_total", "Events.", ("kind",))
+    c.inc('say "hi"\n')
+    c.inc('say "hi"\n', amount=2)
+    g = Gauge("test_depth", "Depth.", fn=lambda: [((), 1.5)])
+    cb = Counter("test_hits_total", "Hits.", ("result",), fn=lambda: [(("hit",), 3), (("miss",), 1)])
+    assert metrics.registry[-3:] == [c, g, cb]
+
+    assert c.render() == (
+        '# HELP test_events_total Events.\n# TYPE test_events_total counter\n'
+        'test_events_total{kind="say \\"hi\\"\\n"} 3\n'
+    )
+    assert g.render() == "# HELP test_depth Depth.\n# TYPE test_depth gauge\ntest_depth 1.5\n"
+    assert cb.render().splitlines()[1:] == [
+        "# TYPE test_hits_total counter", 'test_hits_total{result="hit"} 3', 'test_hits_total{result="miss"} 1'
+    ]
+    assert c.render() + g.render() + cb.render() in metrics.render()
+
+
+async def test_histogram_buckets_are_cumulative(scratch):
+    h = Histogram("test_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 2.0):
+        h.observe(v, "get")
+    assert h.render().splitlines()[2:] == [
+        'test_seconds_bucket{op="get",le="0.1"} 2',
+        'test_seconds_bucket{op="get",le="1.0"} 3',
+        'test_seconds_bucket{op="get",le="+Inf"} 4',
+        'test_seconds_sum{op="get"} 2.65',
+        'test_seconds_count{op="get"} 4',
+    ]
+
+
+async def test_middleware_counts_requests_by_route_and_status(client):
+    async with client:
+        await client.get("/health/live")
+        await client.get("/no/such/route")
+        r = await client.get("/metrics")
+    assert r.headers["content-type"].startswith(PROMETHEUS_TEXT)
+    assert 'http_requests_total{method="GET",route="/health/live",status="200"}' in r.text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in r.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/health/live"}' in r.text
+
+
+async def test_hash_run_and_wait_times_are_recorded_separately():
+    await hasher.hash("!ValidPass2022")
+    rendered = metrics.render()
+    assert 'password_hash_seconds_count{op="hash"}' in rendered
+    assert 'password_hash_wait_seconds_count{op="hash"}' in rendered
+
+
+def test_metric_needs_samples():
+    with pytest.raises(TypeError):
+        Metric("untyped_total", "No samples.")  # type: ignore[abstract]  # pylint: disable=abstract-class-instantiated
@@ -0,0 +1,83 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, Set
+
+import pytest
+
+from app.config import settings
+from app.crud.users import UserFilter, user
+
+if settings.user_backend != "postgres":
+    pytest.skip("query plans need Postgres", allow_module_level=True)
+
+from app.db.session import acquire  # pylint: disable=wrong-import-position
+
+pytestmark = pytest.mark.anyio
+
+ROWS = 5000
+
+SEED = f"""
+INSERT INTO users (id, created_at, updated_at, username, email, password, active, admin)
+SELECT gen_random_uuid(), now() - n * interval '1 minute', now() - n * interval '1 minute', 'user.' || n,
+       'user' || n || '@mail.io', 'x', n % 100 <> 0, n % 500 = 0
+FROM generate_series(1, {ROWS}) AS n
+"""
+
+
+def indexes(plan: Any) -> Iterator[str]:
+    if isinstance(plan, dict):
+        if "Index Name" in plan:
+            yield plan["Index Name"]
+        for v in plan.values():
+            yield from indexes(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            yield from indexes(v)
+
+
+def literal(value: Any) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+async def used_indexes(where: UserFilter, plan_mode: str = "force_custom_plan") -> Set[str]:
+    stmt, params = user.repo.filtered(where)
+    values = ", ".join(literal(a) for a in stmt.args({"limit": 100, **params}))
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            await conn.execute(f"SET LOCAL plan_cache_mode = {plan_mode}")
+            await conn.execute(f"PREPARE probe AS {stmt.sql}")
+            try:
+                plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) EXECUTE probe({values})")
+            finally:
+                await conn.execute("DEALLOCATE probe")
+    return set(indexes(json.loads(plan)))
+
+
+@pytest.fixture()
+async def seeded():
+    async with acquire() as conn:
+        await conn.execute(SEED)
+        await conn.execute("ANALYZE users")
+
+
+@pytest.mark.parametrize("where, expected", [
+    (UserFilter(username_prefix="user.42"), {"ix_users_lower_username_pattern"}),
+    (UserFilter(email_prefix="user42"), {"ix_users_lower_email_pattern"}),
+    (UserFilter(username_contains="er.42"), {"ix_users_lower_username_trgm"}),
+    (UserFilter(email_contains="42@mail"), {"ix_users_lower_email_trgm"}),
+    (UserFilter(admin=True), {"ix_users_admins"}),
+    (UserFilter(active=False), {"ix_users_inactive"}),
+    (UserFilter(updated_since=datetime.now(timezone.utc) - timedelta(minutes=30)), {"ix_users_updated_at_id"}),
+])
+async def test_filter_shapes_use_their_index(seeded, where, expected):
+    assert await used_indexes(where) & expected
+
+
+# asyncpg switches a cached statement to the generic plan after a few runs.
+@pytest.mark.parametrize("where, expected", [
+    (UserFilter(username_prefix="user.42"), "ix_users_lower_username_pattern"),
+    (UserFilter(email_prefix="user42"), "ix_users_lower_email_pattern"),
+])
+async def test_prefix_filters_keep_their_index_under_generic_plans(seeded, where, expected):
+    assert expected in await used_indexes(where, "force_generic_plan")
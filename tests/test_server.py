@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("uvicorn")
+
+from app import __main__ as server  # pylint: disable=wrong-import-position
+from app.config import settings  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture(autouse=True)
+def clean_up():
+    yield  # launcher sizing touches no storage
+
+
+def test_workers_times_pool_fits_connection_budget(monkeypatch):
+    monkeypatch.setattr(settings, "user_backend", "postgres")
+    monkeypatch.setattr(settings, "db_conn_budget", 40)
+    monkeypatch.setattr(settings, "db_pool_max_size", 10)
+    monkeypatch.setattr(settings, "db_pool_min_size", 8)
+
+    for workers, pool_size in ((2, 10), (6, 6), (40, 1)):
+        monkeypatch.setattr(settings, "server_workers", workers)
+        assert server.worker_count() == workers
+        overrides = server.worker_settings(workers)
+        assert overrides["db_pool_max_size"] == pool_size
+        assert overrides["db_pool_min_size"] == min(8, pool_size)
+
+    monkeypatch.setattr(settings, "server_workers", 64)
+    assert server.worker_count() == 40
+
+
+def test_memory_backend_runs_one_worker(monkeypatch):
+    monkeypatch.setattr(settings, "user_backend", "memory")
+    monkeypatch.setattr(settings, "server_workers", 8)
+    assert server.worker_count() == 1
+
+
+def test_unset_workers_default_to_one_per_core(monkeypatch):
+    monkeypatch.setattr(settings, "user_backend", "postgres")
+    monkeypatch.setattr(settings, "db_conn_budget", 90)
+    monkeypatch.setattr(settings, "server_workers", settings.__fields__["server_workers"].default)
+    monkeypatch.setattr(server.os, "cpu_count", lambda: 6)
+    assert server.worker_count() == 6
+
+    monkeypatch.setattr(server.os, "cpu_count", lambda: None)
+    assert server.worker_count() == 1
+
+
+def test_launcher_trusts_forwarded_for_from_configured_proxies(monkeypatch):
+    runs = []
+    monkeypatch.setattr(server.uvicorn, "run", lambda app, **kwargs: runs.append(kwargs))
+    monkeypatch.setattr(server, "apply", lambda overrides: None)
+    monkeypatch.setattr(settings, "server_proxy_ips", "10.0.0.2,10.0.0.3")
+    server.main()
+    assert runs[0]["proxy_headers"] and runs[0]["forwarded_allow_ips"] == "10.0.0.2,10.0.0.3"
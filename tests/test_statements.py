@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+from uuid import UUID, uuid4
+
+import pytest
+
+from app.config import settings
+from app.crud.repository import Stale
+
+if settings.user_backend != "postgres":
+    pytest.skip("statements run on Postgres", allow_module_level=True)
+
+# pylint: disable=wrong-import-position
+from app.crud.postgres import (
+    DELETE, GET, GET_BATCH, GET_BY_NAME, INSERT, PAGE_AFTER, PAGE_FIRST, PURGE, PostgresUserRepository,
+)
+from app.db.session import raw_pool
+from app.db.statements import Statement
+from app.models.users import users
+
+pytestmark = pytest.mark.anyio
+
+MSK = timezone(timedelta(hours=3))
+
+
+def row(n: int) -> Dict[str, Any]:
+    stamp = datetime(2022, 1, 1, tzinfo=MSK) + timedelta(minutes=n)
+    return {
+        "id": uuid4(), "created_at": stamp, "updated_at": stamp, "username": f"User.{n}", "email": f"user{n}@mail.io",
+        "password": "x", "active": True, "admin": False,
+    }
+
+
+def busy() -> int:
+    pool = raw_pool()
+    assert pool
+    return pool.get_size() - pool.get_idle_size()
+
+
+@pytest.fixture()
+async def rows():
+    seeded = [row(n) for n in range(3)]
+    for r in seeded:
+        await INSERT.execute(**r)
+    return seeded
+
+
+async def test_lookups_round_trip_uuids_and_aware_datetimes(rows):
+    found = await GET.fetch_one(_id=rows[0]["id"])
+    assert found and isinstance(found["id"], UUID) and found["id"] == rows[0]["id"]
+    assert found["created_at"] == rows[0]["created_at"] and found["created_at"].utcoffset() == timedelta(0)
+    assert await GET.fetch_one(_id=uuid4()) is None
+
+    by_name = await GET_BY_NAME.fetch_one(username="USER.1")
+    assert by_name and by_name["id"] == rows[1]["id"]
+
+    batch = await GET_BATCH.fetch_all(ids=[rows[2]["id"], uuid4(), rows[0]["id"]])
+    assert {r["id"] for r in batch} == {rows[0]["id"], rows[2]["id"]}
+
+
+async def test_pages_follow_created_at_then_id(rows):
+    first = await PAGE_FIRST.fetch_all(limit=2)
+    assert [r["id"] for r in first] == [r["id"] for r in rows[:2]]
+    assert [r["id"] for r in await PAGE_FIRST.fetch_all(limit=2, skip=2)] == [rows[2]["id"]]
+
+    rest = await PAGE_AFTER.fetch_all(limit=2, after_created_at=first[-1]["created_at"], after_id=first[-1]["id"])
+    assert [r["id"] for r in rest] == [rows[2]["id"]]
+
+
+async def test_update_delete_and_purge(rows):
+    repo  = PostgresUserRepository()
+    stamp = datetime.now(timezone.utc)
+    updated = await repo.update(rows[0]["id"], {"email": "new@mail.io", "updated_at": stamp}, rows[0]["updated_at"])
+    assert updated and updated["email"] == "new@mail.io" and updated["updated_at"] == stamp
+    with pytest.raises(Stale):
+        await repo.update(rows[0]["id"], {"email": "old@mail.io"}, rows[0]["updated_at"])
+
+    assert await DELETE.execute(_id=rows[0]["id"]) is True
+    assert await DELETE.execute(_id=rows[0]["id"]) is None
+    await PURGE.execute()
+    assert not await PAGE_FIRST.fetch_all(limit=10)
+
+
+async def test_iterate_releases_its_connection_when_closed_early(rows):
+    before = busy()
+    stream = Statement(users.select().order_by(users.c.created_at)).iterate()
+    first = await stream.__anext__()
+    assert first["id"] == rows[0]["id"]
+    assert busy() == before + 1
+
+    await stream.aclose()
+    assert busy() == before
+
+
+async def test_concurrent_statements_get_their_own_connections(rows):
+    found = await asyncio.gather(*(GET.fetch_one(_id=r["id"]) for r in rows * 10))
+    assert [f["id"] for f in found if f] == [r["id"] for r in rows * 10]
@@ -0,0 +1,24 @@
+import pytest
+
+from app.throttle import MemoryBucketStore, RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bucket_refills_at_configured_rate():
+    limiter = RateLimiter(capacity=2, per_minute=60)
+    
+    assert await limiter.hit("k") == 0
+    assert await limiter.hit("k") == 0
+    assert 0 < await limiter.hit("k") <= 1
+    assert await limiter.hit("other") == 0
+
+
+async def test_store_memory_is_bounded():
+    store = MemoryBucketStore(maxsize=3)
+    for i in range(10):
+        await store.take(str(i), capacity=5, rate=1)
+    assert len(store) == 3
+    
+    await store.take("idle", capacity=5, rate=1e9)
+    assert len(store) == 1
@@ -1,10 +1,16 @@
-from uuid import UUID
+import csv
+import io
+import json
+from uuid import UUID, uuid4
+
+import pytest
 
 from app.config import settings
-from app.crud.users import user
+from app.crud.users import principals, recent_writes, user
 from app.deps import INV_ADMIN_TKN, INVALID_TOKEN, LACKING_PERMS, NO_PERMISSIONS
+from app.identity import pinned
 from app.routers.auth import USER_INACTIVE
-from app.routers.users import CONFLICT_EMAIL, CONFLICT_NAME
+from app.routers.users import BULK_TOO_BIG, CONFLICT, EXPORT_FIELDS, INVALID_CURSOR, STALE_VERSION
 from tests.conftest import admin_key_auth_headers, err, jwt_auth_headers, login_data
 
 USERS_URL                 = "/users/"
@@ -14,6 +20,8 @@ VALIDATION_ERROR_MSGs     = {"6-20 chars: alphanumeric and dots.", "value is not
                              "Passwords should match."}
 BEARER_NOT_PROVIDED       = "Not authenticated"
 
+pytestmark = pytest.mark.anyio
+
 
 ### REGISTER COMMON USER ###
 async def test_usr_registration_fails_if_payload_invalid(client):
@@ -48,19 +56,19 @@ async def test_reg_fails_if_same_username_or_email(client, reg_data):
         
         r = await client.post(USERS_URL, json=reg_data)
         assert r.status_code == 409
-        assert r.json()["detail"] == CONFLICT_NAME
+        assert r.json()["detail"] == CONFLICT
         
         reg_data["username"] = "NameNewButEmailSame" 
         r = await client.post(USERS_URL, json=reg_data)
         assert r.status_code == 409
-        assert err(r) == CONFLICT_EMAIL
+        assert err(r) == CONFLICT
         
         reg_data["email"] = "bothNameAndEmail@now.unique" 
         r = await client.post(USERS_URL, json=reg_data)
         assert r.status_code == 201
 
 
-async def test_user_created_and_ok_and_pass_not_sent_back(client, reg_data, db):
+async def test_user_created_and_ok_and_pass_not_sent_back(client, reg_data):
     async with client:
         r = await client.post(USERS_URL, json=reg_data)
         assert r.status_code == 201
@@ -71,7 +79,7 @@ async def test_user_created_and_ok_and_pass_not_sent_back(client, reg_data, db):
         
     assert "password" not in details_returned
     
-    u = user.get(db, UUID(details_returned["id"]))
+    u = await user.get(UUID(details_returned["id"]))
     assert u.username == reg_data["username"]
     assert u.email == reg_data["email"]
     password_has_been_hashed = u.password != reg_data["password"]
@@ -102,13 +110,13 @@ async def test_admin_usr_reg_fails_if_no_or_invalid_key(client, reg_data):
         assert err(r) == INV_ADMIN_TKN
 
 
-async def test_admin_usr_201_if_valid_key(client, reg_data, db):
+async def test_admin_usr_201_if_valid_key(client, reg_data):
     reg_data.update({"admin": True})
     async with client:
         r = await client.post(USERS_URL, json=reg_data, headers=admin_key_auth_headers(settings.admin_key))
     assert r.status_code == 201
         
-    u = user.get(db, r.json()["id"])
+    u = await user.get(UUID(r.json()["id"]))
     assert u.username == reg_data["username"]
     assert u.email == reg_data["email"]
     assert u.admin
@@ -125,6 +133,64 @@ async def test_422_if_admin_value_wrong(client, reg_data):
         assert r.status_code == 422
 
 
+### BULK REGISTER USERS ###
+def bulk_rows(*names):
+    return [
+        {"username": n, "email": f"{n}@gmail.com", "password": "Validpass#1", "password2": "Validpass#1"} for n in names
+    ]
+
+
+async def test_bulk_registration_is_admin_only(client, fake_user):
+    usr, usr_pass = await fake_user()
+    
+    async with client:
+        login = await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass))
+        for headers in ({}, jwt_auth_headers(login), {"Authorization": f"Token {settings.admin_key[1:]}"}):
+            r = await client.post(f"{USERS_URL}bulk", json=bulk_rows("bulk.one"), headers=headers)
+            assert r.status_code == 401
+            assert err(r) == INV_ADMIN_TKN
+        
+        r = await client.post(f"{USERS_URL}bulk", json=[{"username": 1}] * 3)
+        assert r.status_code == 401
+    assert await user.get(username="bulk.one") is None
+
+
+async def test_bulk_registration_reports_conflicts_per_row(client, reg_data):
+    async with client:
+        await client.post(USERS_URL, json=reg_data)
+        rows = bulk_rows("bulk.one", "rob.pike", "bulk.two", "bulk.one")
+        r = await client.post(f"{USERS_URL}bulk", json=rows, headers=admin_key_auth_headers(settings.admin_key))
+    assert r.status_code == 200
+    
+    out = r.json()
+    assert [(o["username"], o["status"]) for o in out] == [
+        ("bulk.one", "created"), ("rob.pike", "conflict"), ("bulk.two", "created"), ("bulk.one", "conflict")
+    ]
+    assert [o["id"] is None for o in out] == [False, True, False, True]
+    for o in out[::2]:
+        assert recent_writes.get(UUID(o["id"]))
+        found = await user.get(UUID(o["id"]))
+        assert found and found["username"] == o["username"]
+
+
+async def test_bulk_registration_413_over_size_cap(client, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_size", 2)
+    
+    async with client:
+        rows = bulk_rows("bulk.one", "bulk.two", "bulk.three")
+        r = await client.post(f"{USERS_URL}bulk", json=rows, headers=admin_key_auth_headers(settings.admin_key))
+        assert r.status_code == 413
+        assert err(r) == BULK_TOO_BIG
+        
+        r = await client.post(f"{USERS_URL}bulk", json=[{}] * 3, headers=admin_key_auth_headers(settings.admin_key))
+        assert r.status_code == 413
+        assert err(r) == BULK_TOO_BIG
+        
+        r = await client.post(f"{USERS_URL}bulk", json=rows[:2], headers=admin_key_auth_headers(settings.admin_key))
+        assert r.status_code == 200
+    assert await user.get(username="bulk.three") is None
+
+
 ### JWT ISSUES ###
 async def test_jwt_required_for_usr_opers_but_create(client, reg_data):
         
@@ -149,7 +215,7 @@ async def test_jwt_required_for_usr_opers_but_create(client, reg_data):
     
 
 async def test_invalid_tkn_jwt_errors_back(client, fake_user):
-    usr, _pass = fake_user()
+    usr, _pass = await fake_user()
     
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(usr.username, _pass))
@@ -160,26 +226,26 @@ async def test_invalid_tkn_jwt_errors_back(client, fake_user):
         assert err(r) == INVALID_TOKEN
 
 
-async def test_user_no_longer_exists_errors_back(client, fake_user, db):
-    usr, _pass = fake_user()
+async def test_user_no_longer_exists_errors_back(client, fake_user):
+    usr, _pass = await fake_user()
     
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(usr.username, _pass))
     
-        user.delete(db, usr)
+        await user.delete(usr.id)
         
         r = await client.get(f"{USERS_URL}{usr.id}", headers=jwt_auth_headers(login))
         assert r.status_code == 401
         assert err(r) == INVALID_TOKEN
 
 
-async def test_user_not_active_errors_back(client, fake_user, db):
-    usr, _pass = fake_user()
+async def test_user_not_active_errors_back(client, fake_user):
+    usr, _pass = await fake_user()
     
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(usr.username, _pass))
         
-        user.deactivate(db, usr)
+        await user.deactivate(usr.id)
         
         r = await client.get(f"{USERS_URL}{usr.id}", headers=jwt_auth_headers(login))
         assert r.status_code == 400
@@ -187,7 +253,7 @@ async def test_user_not_active_errors_back(client, fake_user, db):
 
 
 async def test_scope_not_specified_when_login(client, fake_user):
-    usr, _pass = fake_user()
+    usr, _pass = await fake_user()
     
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(usr.username, _pass, scope=""))        
@@ -197,8 +263,8 @@ async def test_scope_not_specified_when_login(client, fake_user):
     
 ### GET ONE USER ###
 async def test_authed_usr_can_get_only_own_details(client, fake_user):
-    usr1, usr1pass = fake_user()
-    usr2, usr2pass = fake_user()
+    usr1, usr1pass = await fake_user()
+    usr2, usr2pass = await fake_user()
 
     async with client:
         login_usr1 = await client.post(LOGIN_URL, data=login_data(usr1.username, usr1pass))
@@ -221,8 +287,8 @@ async def test_authed_usr_can_get_only_own_details(client, fake_user):
     
 
 async def test_admin_can_get_everyones_details(client, fake_user):
-    admin_usr, admin_pass = fake_user(admin=True)
-    common_usr1, _        = fake_user()
+    admin_usr, admin_pass = await fake_user(admin=True)
+    common_usr1, _        = await fake_user()
     
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass))
@@ -235,24 +301,60 @@ async def test_admin_can_get_everyones_details(client, fake_user):
         assert resp_to_others_details_bid.status_code == 200
         
 
-async def test_user_404(client, fake_user, db):
-    admin_usr, admin_pass = fake_user(admin=True)
-    common_usr, _         = fake_user()
+async def test_batch_keeps_order_and_owner_or_admin_rules(client, fake_user, monkeypatch):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    usr, usr_pass         = await fake_user()
+    ghost                 = uuid4()
+    
+    async with client:
+        admin_headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass)))
+        usr_headers   = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass)))
+        
+        ids = [usr.id, ghost, admin_usr.id, usr.id]
+        resp = await client.get(f"{USERS_URL}batch", params={"ids": [str(i) for i in ids]}, headers=admin_headers)
+        assert resp.status_code == 200
+        assert [r and UUID(r["id"]) for r in resp.json()] == [usr.id, None, admin_usr.id, usr.id]
+        
+        own = await client.get(f"{USERS_URL}batch", params={"ids": str(usr.id)}, headers=usr_headers)
+        assert own.status_code == 200
+        mixed = {"ids": [str(usr.id), str(admin_usr.id)]}
+        others = await client.get(f"{USERS_URL}batch", params=mixed, headers=usr_headers)
+        assert others.status_code == 403
+        
+        monkeypatch.setattr(settings, "batch_max_size", 3)
+        too_many = await client.get(f"{USERS_URL}batch", params={"ids": [str(i) for i in ids]}, headers=admin_headers)
+        assert too_many.status_code == 413
+
+
+async def test_user_404(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    common_usr, _         = await fake_user()
     
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass))
         headers = jwt_auth_headers(login)
         
-        user.delete(db, common_usr)
+        await user.delete(common_usr.id)
         
         r = await client.get(f"{USERS_URL}{common_usr.id}", headers=headers)
         assert r.status_code == 404
 
 
+async def test_read_your_writes_pin_ends_with_the_request(client, fake_user):
+    usr, usr_pass = await fake_user()
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass)))
+        assert recent_writes.get(usr.id)
+        resp = await client.get(f"{USERS_URL}{usr.id}", headers=headers)
+        assert resp.status_code == 200
+    assert pinned.get() is False
+
+
 ### LIST ALL USERS ###
 async def test_only_admin_can_list_all_users(client, fake_user):
-    admin_usr, admin_pass = fake_user(admin=True)
-    usr, usr_pass = fake_user()
+    admin_usr, admin_pass = await fake_user(admin=True)
+    usr, usr_pass = await fake_user()
 
     async with client:
         admin_login = await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass))
@@ -268,9 +370,9 @@ async def test_only_admin_can_list_all_users(client, fake_user):
 
 
 async def test_empty_list_when_no_users_after_offset(client, fake_user):
-    admin_usr, admin_pass = fake_user(admin=True)
-    _, _                  = fake_user()
-    _, _                  = fake_user()
+    admin_usr, admin_pass = await fake_user(admin=True)
+    _, _                  = await fake_user()
+    _, _                  = await fake_user()
 
     async with client:
         login = await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass))
@@ -280,6 +382,179 @@ async def test_empty_list_when_no_users_after_offset(client, fake_user):
         assert len(resp.json()) == 0  # pylint: disable=compare-to-zero
 
 
+async def test_cursor_pages_walk_all_users_via_link_header(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    others = [(await fake_user())[0] for _ in range(4)]
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass)))
+        seen, url = [], f"{USERS_URL}?limit=2"
+        while url:
+            resp = await client.get(url, headers=headers)
+            assert resp.status_code == 200
+            seen.extend(u["id"] for u in resp.json())
+            link = resp.headers.get("Link", "")
+            assert not link or link.endswith('>; rel="next"')
+            url = link.split(">")[0].lstrip("<")
+        assert seen == [str(u.id) for u in (admin_usr, *others)]
+        
+        resp = await client.get(f"{USERS_URL}?cursor=not-a-cursor", headers=headers)
+        assert resp.status_code == 400
+        assert err(resp) == INVALID_CURSOR
+
+
+async def test_list_filters_are_kept_in_next_link(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    first, _              = await fake_user()
+    second, _             = await fake_user()
+
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass)))
+        resp = await client.get(f"{USERS_URL}?admin=false&limit=1", headers=headers)
+        assert [u["id"] for u in resp.json()] == [str(first.id)]
+        assert "admin=false" in resp.headers["Link"]
+
+        next_url = resp.headers["Link"].split(">")[0].lstrip("<")
+        resp = await client.get(next_url, headers=headers)
+        assert [u["id"] for u in resp.json()] == [str(second.id)]
+
+
+### EXPORT USERS ###
+async def test_export_streams_ndjson_without_passwords(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    usr, usr_pass = await fake_user()
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass)))
+        resp = await client.get(f"{USERS_URL}export", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        assert resp.headers["content-disposition"] == "attachment; filename=users.ndjson"
+        
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert [line["id"] for line in lines] == [str(admin_usr.id), str(usr.id)]
+        assert all(list(line) == EXPORT_FIELDS for line in lines)
+        assert lines[1]["username"] == usr.username and lines[1]["created_at"] == usr.created_at.isoformat()
+        
+        common = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass)))
+        resp = await client.get(f"{USERS_URL}export", headers=common)
+        assert resp.status_code == 403
+
+
+async def test_export_streams_filtered_csv(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    usr, _ = await fake_user()
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass)))
+        resp = await client.get(f"{USERS_URL}export", params={"format": "csv"}, headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(resp.text)))
+        assert list(rows[0]) == EXPORT_FIELDS
+        assert [r["id"] for r in rows] == [str(admin_usr.id), str(usr.id)]
+        assert rows[0]["admin"] == "True" and rows[1]["admin"] == "False"
+        
+        since = {"format": "csv", "created_since": usr.created_at.isoformat()}
+        resp = await client.get(f"{USERS_URL}export", params=since, headers=headers)
+        assert [r["id"] for r in csv.DictReader(io.StringIO(resp.text))] == [str(usr.id)]
+
+
 # ### UPDATE USER ###
+async def test_self_update_reads_user_once(client, fake_user, monkeypatch):
+    usr, usr_pass = await fake_user()
+    
+    calls = []
+    for name in ("get", "update"):
+        def spy(name=name, orig=getattr(user.repo, name)):
+            async def call(*args, **kwargs):
+                calls.append(name)
+                return await orig(*args, **kwargs)
+            return call
+        monkeypatch.setattr(user.repo, name, spy())
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass)))
+        principals.clear()
+        calls.clear()
+        upd = {"password": "!NewValidPass2022", "password2": "!NewValidPass2022", "oldpassword": usr_pass}
+        resp = await client.put(f"{USERS_URL}{usr.id}", json=upd, headers=headers)
+        assert resp.status_code == 204
+        assert calls == ["get", "update"]
+
+
+async def test_update_404_if_no_such_user(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    
+    async with client:
+        login = await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass))
+        headers = jwt_auth_headers(login)
+        resp = await client.put(f"{USERS_URL}{uuid4()}", json={"username": "ghost.user"}, headers=headers)
+        assert resp.status_code == 404
+
+
+async def test_unchanged_user_is_not_modified_until_updated(client, fake_user):
+    usr, usr_pass = await fake_user()
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass)))
+        first = await client.get(f"{USERS_URL}{usr.id}", headers=headers)
+        tag = first.headers["ETag"]
+        assert tag.startswith('W/"')
+        
+        resp = await client.get(f"{USERS_URL}{usr.id}", headers={**headers, "If-None-Match": tag})
+        assert resp.status_code == 304 and not resp.content and resp.headers["ETag"] == tag
+        
+        upd = await client.put(f"{USERS_URL}{usr.id}", json={"email": "polled@gmail.com"}, headers=headers)
+        assert upd.status_code == 204 and upd.headers["ETag"] != tag
+        
+        resp = await client.get(f"{USERS_URL}{usr.id}", headers={**headers, "If-None-Match": tag})
+        assert resp.status_code == 200 and resp.headers["ETag"] == upd.headers["ETag"]
+        assert resp.json()["email"] == "polled@gmail.com"
+
+
+async def test_not_modified_is_answered_from_the_principal_cache(client, fake_user, monkeypatch):
+    usr, usr_pass = await fake_user()
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(usr.username, usr_pass)))
+        tag = (await client.get(f"{USERS_URL}{usr.id}", headers=headers)).headers["ETag"]
+        assert principals.get(usr.id)
+        recent_writes.clear()
+        
+        reads = []
+        get = user.repo.get
+        monkeypatch.setattr(user.repo, "get", lambda *args, **kwargs: reads.append(args) or get(*args, **kwargs))
+        resp = await client.get(f"{USERS_URL}{usr.id}", headers={**headers, "If-None-Match": tag})
+        assert resp.status_code == 304 and resp.headers["ETag"] == tag
+        assert not reads
+
+
+async def test_update_412_if_version_is_stale(client, fake_user):
+    admin_usr, admin_pass = await fake_user(admin=True)
+    usr, _                = await fake_user()
+    
+    async with client:
+        headers = jwt_auth_headers(await client.post(LOGIN_URL, data=login_data(admin_usr.username, admin_pass)))
+        tag = (await client.get(f"{USERS_URL}{usr.id}", headers=headers)).headers["ETag"]
+        other = (await client.get(f"{USERS_URL}{admin_usr.id}", headers=headers)).headers["ETag"]
+        
+        edit = {"username": "first.edit"}
+        first = await client.put(f"{USERS_URL}{usr.id}", json=edit, headers={**headers, "If-Match": tag})
+        assert first.status_code == 204
+        
+        for if_match in (tag, other, "garbage"):
+            edit = {"username": "lost.edit"}
+            resp = await client.put(f"{USERS_URL}{usr.id}", json=edit, headers={**headers, "If-Match": if_match})
+            assert resp.status_code == 412
+            assert err(resp) == STALE_VERSION
+        
+        resp = await client.get(f"{USERS_URL}{usr.id}", headers=headers)
+        assert resp.json()["username"] == "first.edit"
+        
+        ghost = f"{USERS_URL}{uuid4()}"
+        resp = await client.put(ghost, json={"username": "ghost.user"}, headers={**headers, "If-Match": "*"})
+        assert resp.status_code == 412 and err(resp) == STALE_VERSION
+
 
 # ### DELETE USER ###